@@ -0,0 +1,134 @@
+"""
+Streaming archive export for Parenta Scraper
+Appends each photo to a ZIP64 or tar file as soon as it has finished downloading, so the
+archive is complete when the last download lands instead of re-reading the whole folder after
+"""
+import io
+import json
+import os
+import queue
+import tarfile
+import threading
+import time
+import zipfile
+from pathlib import Path
+
+ARCHIVE_MANIFEST_NAME = "manifest.json"
+
+# GUI choice -> archive file extension (None = no archive)
+ARCHIVE_FORMATS = {"None": None, "ZIP": ".zip", "Tar": ".tar"}
+
+
+class ArchiveSink:
+    """
+    Pipeline/PostProcessor listener that writes finished files into one archive
+    A single writer thread owns the archive, so download workers never wait on it; photos are
+    stored as-is (ZIP_STORED / plain tar) because JPEGs and videos don't compress further
+    """
+
+    def __init__(self, archive_path, download_dir, log=print):
+        self.archive_path = Path(archive_path)
+        self.download_dir = Path(download_dir)
+        self.log = log
+        # Written under a temporary name so a half-finished archive is never mistaken for a full one
+        self.temp_path = self.archive_path.with_name(self.archive_path.name + ".part")
+        if self.archive_path.suffix == ".tar":
+            self._tar = tarfile.open(self.temp_path, 'w', format=tarfile.PAX_FORMAT)
+            self._zip = None
+        else:
+            self._zip = zipfile.ZipFile(self.temp_path, 'w', compression=zipfile.ZIP_STORED, allowZip64=True)
+            self._tar = None
+        self.queue = queue.Queue()
+        self.files = []
+        self.bytes_written = 0
+        self._names = set()
+        self._closed = False
+        self._thread = threading.Thread(target=self._writer, daemon=True)
+        self._thread.start()
+
+    def on_downloaded(self, url, dest_path, result, fingerprint, post_data):
+        """Listener: queue a finished file for the archive"""
+        if result != 'failed':
+            self.queue.put((Path(dest_path), url, post_data))
+
+    def _arcname(self, path):
+        """Archive path: relative to the download folder where possible"""
+        try:
+            return path.relative_to(self.download_dir).as_posix()
+        except ValueError:
+            return path.name
+
+    def _writer(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            path, url, post_data = item
+            try:
+                self._add(path, url, post_data)
+            except Exception as e:
+                self.log(f"Archive: could not add {path.name}: {str(e)[:80]}")
+
+    def _add(self, path, url=None, post_data=None):
+        arcname = self._arcname(path)
+        if arcname in self._names or not path.exists():
+            return
+        if self._zip:
+            self._zip.write(path, arcname)
+        else:
+            self._tar.add(path, arcname)
+        self._names.add(arcname)
+        size = path.stat().st_size
+        self.bytes_written += size
+        record = {'file': arcname, 'size': size}
+        if url:
+            record['url'] = url
+        if post_data:
+            record['post'] = {field: post_data.get(field, '') for field in ('date', 'time', 'event_type')}
+        self.files.append(record)
+
+    def _add_bytes(self, arcname, data):
+        if self._zip:
+            self._zip.writestr(arcname, data)
+        else:
+            info = tarfile.TarInfo(arcname)
+            info.size = len(data)
+            info.mtime = time.time()
+            self._tar.addfile(info, io.BytesIO(data))
+
+    def close(self, extra_files=()):
+        """
+        Wait for queued files, add extra_files (e.g. the CSV) and the manifest, and finish the archive
+        Returns the number of files archived
+        """
+        if self._closed:
+            return len(self.files)
+        self._finish(extra_files, complete=True)
+        os.replace(self.temp_path, self.archive_path)
+        return len(self.files)
+
+    def abort(self):
+        """
+        Finish a cancelled or failed run's archive under an _incomplete name, so it is never
+        taken for a full archive and the next run doesn't overwrite it
+        Returns the path it was saved to (None if the archive was already closed)
+        """
+        if self._closed:
+            return None
+        self._finish((), complete=False)
+        incomplete_path = self.archive_path.with_name(
+            f"{self.archive_path.stem}_incomplete{self.archive_path.suffix}")
+        os.replace(self.temp_path, incomplete_path)
+        return incomplete_path
+
+    def _finish(self, extra_files, complete):
+        self._closed = True
+        self.queue.put(None)
+        self._thread.join()
+
+        for path in extra_files:
+            if path and Path(path).exists():
+                self._add(Path(path))
+        manifest = {'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'complete': complete, 'files': self.files}
+        self._add_bytes(ARCHIVE_MANIFEST_NAME, json.dumps(manifest, indent=1).encode('utf-8'))
+        (self._zip or self._tar).close()
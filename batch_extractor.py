@@ -2,19 +2,60 @@
 JavaScript Batch Data Extraction for Parenta Scraper
 Fast DOM operations using single JavaScript execution instead of multiple Selenium calls
 """
+import re
 import time
+from datetime import datetime
 
-def extract_all_posts_javascript(driver, newsfeed_selector):
+# Date/time formats seen in the newsfeed, tried in order by parse_post_datetime
+POST_DATE_FORMATS = (
+    '%d %B %Y', '%d %b %Y', '%B %d %Y', '%b %d %Y',
+    '%d/%m/%Y', '%d-%m-%Y', '%Y-%m-%d', '%d/%m/%y', '%d %B', '%d %b',
+)
+POST_TIME_FORMATS = ('%H:%M', '%I:%M %p', '%H:%M:%S', '%I %p')
+
+VIDEO_EXTENSIONS = ('.mp4', '.mov', '.m4v', '.webm', '.3gp', '.avi', '.mkv')
+
+# Resized-variant markers seen in storage/CDN filenames, ranked smallest to largest.
+# Unmarked filenames are treated as originals (rank 5).
+SIZE_MARKER_RANKS = {
+    'thumb': 1, 'thumbnail': 1, 'thumbs': 1, 'thumbnails': 1, 'tn': 1, 'xs': 1,
+    'small': 2, 'sm': 2, 'preview': 2,
+    'medium': 3, 'med': 3, 'md': 3,
+    'large': 4, 'lg': 4, 'big': 4,
+    'original': 6, 'orig': 6, 'full': 6, 'fullsize': 6,
+}
+# Short markers that also turn up inside ordinary names and folders (e.g. /big-day/, md5_...) -
+# only trusted as a delimited suffix at the end of the filename
+SUFFIX_ONLY_MARKERS = {'tn', 'xs', 'sm', 'med', 'md', 'lg', 'big', 'orig', 'full'}
+ORIGINAL_RANK = 5
+RESIZED_RANK = 3
+
+_MARKER_ALTERNATION = '|'.join(sorted(SIZE_MARKER_RANKS, key=len, reverse=True))
+_WORD_MARKER_ALTERNATION = '|'.join(sorted(set(SIZE_MARKER_RANKS) - SUFFIX_ONLY_MARKERS, key=len, reverse=True))
+# e.g. photo_sm.jpg, photo-big.jpg (any marker)
+_NAME_SUFFIX_RE = re.compile(rf'[_\-.]({_MARKER_ALTERNATION})$', re.IGNORECASE)
+# e.g. photo_thumb.jpg, thumb_photo.jpg, photo-small.jpg
+_NAME_MARKER_RE = re.compile(rf'(^|[_\-.])({_WORD_MARKER_ALTERNATION})(?=[_\-.]|$)', re.IGNORECASE)
+# e.g. /thumbnails/photo.jpg
+_DIR_MARKER_RE = re.compile(rf'/({_WORD_MARKER_ALTERNATION})(?=/)', re.IGNORECASE)
+# e.g. photo-300x200.jpg, photo_640w.jpg, photo=s640.jpg
+_DIMENSION_RE = re.compile(r'[_\-=](?:(\d{2,5})x\d{2,5}|(\d{2,5})w|s(\d{2,5}))(?=\.|$)', re.IGNORECASE)
+
+def extract_all_posts_javascript(driver, newsfeed_selector, start_index=0, end_index=None):
     """
     Extract all post data using a single JavaScript execution
     50-100x faster than individual Selenium DOM operations
+    start_index/end_index limit extraction to a window of containers (for incremental scraping)
     """
     javascript_code = """
-    // Get all containers
+    // Get all containers, optionally only a window of them (start, end)
     const containers = document.querySelectorAll(arguments[0]);
+    const startIndex = arguments[1] || 0;
+    const endIndex = arguments[2] == null ? containers.length : arguments[2];
     
     // Extract data from all containers in one pass
-    return Array.from(containers).map((container, index) => {
+    return Array.from(containers).slice(startIndex, endIndex).map((container, offset) => {
+        const index = startIndex + offset;
         try {
             // Extract container ID
             const id = container.getAttribute('data-id') || container.id || `container_${index}`;
@@ -83,6 +124,14 @@ def extract_all_posts_javascript(driver, newsfeed_selector):
                 .filter(src => src.includes('storage101.lon3.clouddrive.com')) // Parenta storage only
                 .filter((src, index, arr) => arr.indexOf(src) === index); // Remove duplicates
             
+            // Extract video URLs - <video src> and <source> children on Parenta storage
+            const video_urls = Array.from(container.querySelectorAll('video, video source'))
+                .map(el => el.getAttribute('src') || el.getAttribute('data-src') || el.currentSrc)
+                .filter(src => src && src.startsWith('http'))
+                .filter(src => src.includes('storage101.lon3.clouddrive.com')) // Parenta storage only
+                .map(src => src.split('?')[0])
+                .filter((src, index, arr) => arr.indexOf(src) === index); // Remove duplicates
+            
             // Extract content text - try Parenta-specific selectors first
             let content = '';
             const contentSelectors = [
@@ -113,6 +162,7 @@ def extract_all_posts_javascript(driver, newsfeed_selector):
                 event_type: event_type,
                 content: content,
                 image_urls: image_urls,
+                video_urls: video_urls,
                 container_index: index
             };
             
@@ -133,7 +183,7 @@ def extract_all_posts_javascript(driver, newsfeed_selector):
     
     try:
         # Execute JavaScript and get all data at once
-        all_data = driver.execute_script(javascript_code, newsfeed_selector)
+        all_data = driver.execute_script(javascript_code, newsfeed_selector, start_index, end_index)
         
         # Filter out empty/invalid entries
         valid_data = [
@@ -141,6 +191,10 @@ def extract_all_posts_javascript(driver, newsfeed_selector):
             if post and post.get('id') and post.get('id') != 'error_container_0'
         ]
         
+        for post in valid_data:
+            split_video_urls(post)
+            post['image_urls'] = select_best_image_urls(post.get('image_urls', []))
+        
         return valid_data
         
     except Exception as e:
@@ -161,16 +215,148 @@ def get_selectors_from_constants():
     }
 
 
-def extract_all_posts_with_carousel_images_js(driver, newsfeed_selector):
+def parse_post_datetime(date_text, time_text=''):
+    """
+    Parse the feed's date/time strings (e.g. 'Monday 14th October 2024', '14/10/2024', '10:32 AM')
+    Returns a datetime, or None if the date can't be understood
+    """
+    if not date_text:
+        return None
+    date_clean = re.sub(r'(\d)(st|nd|rd|th)\b', r'\1', date_text.strip(), flags=re.IGNORECASE)
+    date_clean = re.sub(r'[,\s]+', ' ', date_clean).strip()
+    # Drop a leading weekday name ('Monday', 'Mon')
+    date_clean = re.sub(r'^[A-Za-z]{3,9}day |^(Mon|Tue|Wed|Thu|Fri|Sat|Sun) ', '', date_clean)
+
+    parsed_date = None
+    for fmt in POST_DATE_FORMATS:
+        try:
+            parsed_date = datetime.strptime(date_clean, fmt)
+            break
+        except ValueError:
+            continue
+    if parsed_date is None:
+        return None
+    if parsed_date.year == 1900:
+        # Recent posts show no year - assume the most recent matching date
+        today = datetime.now()
+        parsed_date = parsed_date.replace(year=today.year)
+        if parsed_date > today:
+            parsed_date = parsed_date.replace(year=today.year - 1)
+
+    time_clean = (time_text or '').strip().upper().replace('.', ':')
+    time_clean = re.sub(r'\s*(AM|PM)$', r' \1', time_clean)
+    for fmt in POST_TIME_FORMATS:
+        try:
+            parsed_time = datetime.strptime(time_clean, fmt)
+            return parsed_date.replace(hour=parsed_time.hour, minute=parsed_time.minute)
+        except ValueError:
+            continue
+    return parsed_date
+
+
+def image_variant_info(url):
+    """
+    Split an image URL into (group_key, rank, width)
+    URLs with the same group_key are size variants of one photo; rank/width say how big this one is
+    """
+    clean = url.split('?')[0].split('#')[0]
+    directory, _, filename = clean.rpartition('/')
+    stem, dot, extension = filename.rpartition('.')
+    if not dot:
+        stem, extension = filename, ''
+
+    rank = ORIGINAL_RANK
+    width = 0
+
+    dimension = _DIMENSION_RE.search(stem)
+    if dimension:
+        width = int(next(group for group in dimension.groups() if group))
+        rank = RESIZED_RANK
+        stem = stem[:dimension.start()] + stem[dimension.end():]
+
+    marked_rank = rank
+    base = stem
+    suffix = _NAME_SUFFIX_RE.search(base)
+    if suffix:
+        marked_rank = SIZE_MARKER_RANKS[suffix.group(1).lower()]
+        base = base[:suffix.start()]
+    for match in list(_NAME_MARKER_RE.finditer(base)):
+        marked_rank = SIZE_MARKER_RANKS[match.group(2).lower()]
+    base = _NAME_MARKER_RE.sub('', base).strip('_-.')
+    if base:
+        # A name that is nothing but a marker (e.g. small.jpg) is a photo's own name, not a variant
+        stem, rank = base, marked_rank
+
+    dir_match = _DIR_MARKER_RE.search(directory + '/')
+    if dir_match:
+        rank = SIZE_MARKER_RANKS[dir_match.group(1).lower()]
+        directory = _DIR_MARKER_RE.sub('', directory + '/').rstrip('/')
+
+    # Not case-folded - storage paths are case-sensitive, so IMG_1.jpg and img_1.jpg are different photos
+    group_key = f"{directory}/{stem}.{extension}"
+    return group_key, rank, width
+
+
+def is_video_url(url):
+    """True if the URL path ends in a known video extension"""
+    return url.split('?')[0].lower().endswith(VIDEO_EXTENSIONS)
+
+
+def split_video_urls(post):
+    """
+    Move video files picked up by the broad image search into post['video_urls']
+    Data-attribute and script scans can find .mp4 links alongside photos
+    """
+    video_urls = list(post.get('video_urls') or [])
+    image_urls = []
+    for url in post.get('image_urls', []):
+        if is_video_url(url):
+            if url not in video_urls:
+                video_urls.append(url)
+        else:
+            image_urls.append(url)
+    post['image_urls'] = image_urls
+    post['video_urls'] = video_urls
+    return post
+
+
+def select_best_image_urls(image_urls, width_hints=None):
+    """
+    Collapse size variants of the same photo to the single best-quality URL
+    Picks by naming-pattern rank first, then by width (srcset descriptors / natural size)
+    Order follows each photo's first appearance
+    """
+    width_hints = width_hints or {}
+    best = {}
+    order = []
+    for url in image_urls:
+        if not url:
+            continue
+        group_key, rank, width = image_variant_info(url)
+        width = max(width, width_hints.get(url.split('?')[0], 0) or 0)
+        score = (rank, width)
+        if group_key not in best:
+            order.append(group_key)
+            best[group_key] = (score, url)
+        elif score > best[group_key][0]:
+            best[group_key] = (score, url)
+    return [best[key][1] for key in order]
+
+
+def extract_all_posts_with_carousel_images_js(driver, newsfeed_selector, start_index=0, end_index=None):
     """
     JavaScript-based carousel image extraction with clicking fallback for incomplete carousels
+    start_index/end_index limit extraction to a window of containers (for incremental scraping)
     """
     javascript_code = """
-    // Get all containers
+    // Get all containers, optionally only a window of them (start, end)
     const containers = document.querySelectorAll(arguments[0]);
+    const startIndex = arguments[1] || 0;
+    const endIndex = arguments[2] == null ? containers.length : arguments[2];
     
     // Extract data from all containers in one pass
-    return Array.from(containers).map((container, index) => {
+    return Array.from(containers).slice(startIndex, endIndex).map((container, offset) => {
+        const index = startIndex + offset;
         try {
             // Extract container ID
             const id = container.getAttribute('data-id') || container.id || `container_${index}`;
@@ -232,9 +418,35 @@ def extract_all_posts_with_carousel_images_js(driver, newsfeed_selector):
             // Enhanced robust image extraction for carousels
             let all_image_urls = new Set();
             
+            // Width hints per URL so Python can keep only the largest variant of each photo
+            const image_widths = {};
+            const addWidthHint = (src, width) => {
+                if (!src || !width) return;
+                const cleanUrl = src.split('?')[0];
+                if (!image_widths[cleanUrl] || image_widths[cleanUrl] < width) {
+                    image_widths[cleanUrl] = width;
+                }
+            };
+            
+            // Every candidate in a srcset, not just the first, with its width descriptor
+            const srcsetCandidates = (srcset, img) => (srcset || '').split(',')
+                .map(part => part.trim().split(/\\s+/))
+                .filter(parts => parts[0])
+                .map(([url, descriptor]) => {
+                    let width = 0;
+                    if (descriptor && descriptor.endsWith('w')) {
+                        width = parseInt(descriptor, 10);
+                    } else if (descriptor && descriptor.endsWith('x')) {
+                        width = Math.round(parseFloat(descriptor) * (img.naturalWidth || 0));
+                    }
+                    addWidthHint(url, width);
+                    return url;
+                });
+            
             // Method 1: Get all currently visible images with expanded attribute search
             const visibleImages = container.querySelectorAll('img');
             visibleImages.forEach(img => {
+                addWidthHint(img.currentSrc || img.src, img.naturalWidth);
                 const possibleSources = [
                     img.src,
                     img.getAttribute('data-src'),
@@ -244,7 +456,8 @@ def extract_all_posts_with_carousel_images_js(driver, newsfeed_selector):
                     img.getAttribute('ng-src'),
                     img.getAttribute('x-src'),
                     img.getAttribute('data-lazy-src'),
-                    img.getAttribute('data-srcset')?.split(' ')[0], // First URL from srcset
+                    ...srcsetCandidates(img.getAttribute('srcset'), img),
+                    ...srcsetCandidates(img.getAttribute('data-srcset'), img),
                     img.currentSrc
                 ];
                 
@@ -359,6 +572,14 @@ def extract_all_posts_with_carousel_images_js(driver, newsfeed_selector):
                 }
             }
             
+            // Extract video URLs - <video src> and <source> children on Parenta storage
+            const video_urls = Array.from(container.querySelectorAll('video, video source'))
+                .map(el => el.getAttribute('src') || el.getAttribute('data-src') || el.currentSrc)
+                .filter(src => src && src.startsWith('http'))
+                .filter(src => src.includes('storage101.lon3.clouddrive.com')) // Parenta storage only
+                .map(src => src.split('?')[0])
+                .filter((src, index, arr) => arr.indexOf(src) === index); // Remove duplicates
+            
             // Extract content text - try Parenta-specific selectors first
             let content = '';
             const contentSelectors = [
@@ -389,6 +610,8 @@ def extract_all_posts_with_carousel_images_js(driver, newsfeed_selector):
                 event_type: event_type,
                 content: content,
                 image_urls: Array.from(all_image_urls),
+                image_widths: image_widths,
+                video_urls: video_urls,
                 container_index: index,
                 has_carousel: circleDots.length > 1,
                 carousel_count: circleDots.length
@@ -413,7 +636,7 @@ def extract_all_posts_with_carousel_images_js(driver, newsfeed_selector):
     
     try:
         # Execute JavaScript and get all data at once
-        all_data = driver.execute_script(javascript_code, newsfeed_selector)
+        all_data = driver.execute_script(javascript_code, newsfeed_selector, start_index, end_index)
         
         # Filter out empty/invalid entries
         valid_data = [
@@ -424,12 +647,15 @@ def extract_all_posts_with_carousel_images_js(driver, newsfeed_selector):
         # Check each post for carousel fallback needs
         enhanced_data = []
         for i, post in enumerate(valid_data):
+            split_video_urls(post)
+            post['image_urls'] = select_best_image_urls(post.get('image_urls', []), post.get('image_widths'))
             if post.get('has_carousel') and post.get('carousel_count', 0) > len(post.get('image_urls', [])):
                 # Carousel detected but insufficient images found - use clicking fallback
                 print(f"Carousel fallback needed for post {i}: expected {post.get('carousel_count')} images, found {len(post.get('image_urls', []))}")
                 
                 try:
-                    clicked_images = extract_carousel_images_by_clicking(driver, newsfeed_selector, i)
+                    clicked_images = extract_carousel_images_by_clicking(driver, newsfeed_selector, post.get('container_index', i))
+                    clicked_images = select_best_image_urls(clicked_images, post.get('image_widths'))
                     if clicked_images and len(clicked_images) > len(post.get('image_urls', [])):
                         print(f"Clicking fallback successful: found {len(clicked_images)} images")
                         post['image_urls'] = clicked_images
@@ -449,7 +675,7 @@ def extract_all_posts_with_carousel_images_js(driver, newsfeed_selector):
         
     except Exception as e:
         print(f"JavaScript carousel extraction failed: {e}")
-        return extract_all_posts_javascript(driver, newsfeed_selector)
+        return extract_all_posts_javascript(driver, newsfeed_selector, start_index, end_index)
 
 
 def extract_carousel_images_by_clicking(driver, container_selector, container_index):
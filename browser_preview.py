@@ -0,0 +1,107 @@
+"""
+Live browser preview for Parenta Scraper
+Grabs small JPEG frames through the Chrome DevTools Protocol instead of full-size PNG
+screenshots, and decodes them on a background thread so the scraper only pays for the capture
+"""
+import base64
+import io
+import threading
+import time
+
+PREVIEW_FPS = 2  # Most frames per second captured from the browser
+PREVIEW_JPEG_QUALITY = 50
+PREVIEW_SIZE = (500, 600)  # Preview area in the GUI
+
+
+class BrowserPreview:
+    """
+    Rate-limited frame source for the GUI preview
+    capture() runs on the scraper thread (it must share the WebDriver); decoding happens on a
+    worker thread that only ever keeps the newest frame, and the GUI polls take_frame()
+    """
+
+    def __init__(self, size=PREVIEW_SIZE, fps=PREVIEW_FPS, quality=PREVIEW_JPEG_QUALITY):
+        self.size = size
+        self.interval = 1.0 / fps
+        self.quality = quality
+        self._last_capture = 0.0
+        self._use_cdp = True
+        self._pending = None
+        self._frame = None
+        self._frame_id = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._decoder, daemon=True)
+        self._thread.start()
+
+    def capture(self, driver, force=False):
+        """
+        Grab a frame if the rate limit allows (force=True for key moments like after login)
+        Returns True if a frame was captured
+        """
+        now = time.monotonic()
+        if not force and now - self._last_capture < self.interval:
+            return False
+        self._last_capture = now
+        if self._use_cdp:
+            try:
+                data = ('jpeg', self._capture_cdp(driver))
+            except Exception:
+                self._use_cdp = False  # Not Chromium (or CDP blocked) - fall back to WebDriver PNGs
+        if not self._use_cdp:
+            data = ('png', driver.get_screenshot_as_png())
+        with self._cond:
+            self._pending = data  # Replaces any frame not yet decoded - only the newest matters
+            self._cond.notify()
+        return True
+
+    def _capture_cdp(self, driver):
+        """Page.captureScreenshot of the visible viewport, scaled down and JPEG-encoded by Chrome"""
+        viewport = driver.execute_cdp_cmd('Page.getLayoutMetrics', {})['cssVisualViewport']
+        width, height = viewport['clientWidth'], viewport['clientHeight']
+        scale = min(self.size[0] / width, self.size[1] / height, 1.0)
+        result = driver.execute_cdp_cmd('Page.captureScreenshot', {
+            'format': 'jpeg',
+            'quality': self.quality,
+            'clip': {'x': viewport['pageX'], 'y': viewport['pageY'],
+                     'width': width, 'height': height, 'scale': scale},
+            'optimizeForSpeed': True,
+        })
+        return result['data']
+
+    def _decoder(self):
+        from PIL import Image
+
+        while True:
+            with self._cond:
+                while self._pending is None and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                kind, data = self._pending
+                self._pending = None
+            try:
+                raw = base64.b64decode(data) if kind == 'jpeg' else data
+                image = Image.open(io.BytesIO(raw))
+                image.draft('RGB', self.size)
+                image = image.convert('RGB')
+                if image.width > self.size[0] or image.height > self.size[1]:
+                    image.thumbnail(self.size, Image.Resampling.BILINEAR)
+            except Exception:
+                continue
+            with self._cond:
+                self._frame = image
+                self._frame_id += 1
+
+    def take_frame(self, last_id):
+        """(frame_id, PIL image) if there is a frame newer than last_id, else None"""
+        with self._cond:
+            if self._frame_id == last_id or self._frame is None:
+                return None
+            return self._frame_id, self._frame
+
+    def close(self):
+        """Stop the decoder thread; the preview lives for the whole app, so this is for shutdown"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
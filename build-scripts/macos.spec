@@ -51,6 +51,7 @@ a = Analysis(
     runtime_hooks=[],
     excludes=[
         # Exclude unnecessary modules to reduce size
+        # (without numpy, Find Duplicates falls back to pure-Python dHash instead of pHash)
         'matplotlib', 'numpy', 'scipy', 'pandas',
         'jupyter', 'IPython',
         'test', 'tests', 'testing',
@@ -0,0 +1,272 @@
+"""
+SQLite catalog for Parenta Scraper
+Posts, images, download state and runs in one indexed database next to the CSV, written in
+batched transactions on a background thread so the scrape never waits on disk
+Post text is also indexed with FTS5 for search
+"""
+import queue
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from batch_extractor import parse_post_datetime
+from image_store import post_fingerprint
+
+CATALOG_BATCH_SIZE = 500  # Statements per transaction
+CATALOG_FLUSH_SECONDS = 1.0  # Longest a statement waits before its batch is committed
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    mode TEXT,
+    started_at TEXT,
+    finished_at TEXT,
+    status TEXT,
+    posts INTEGER DEFAULT 0,
+    images_downloaded INTEGER DEFAULT 0,
+    images_linked INTEGER DEFAULT 0,
+    images_failed INTEGER DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS posts (
+    fingerprint TEXT PRIMARY KEY,
+    date TEXT,
+    time TEXT,
+    taken_at TEXT,
+    event_type TEXT,
+    content TEXT,
+    image_count INTEGER,
+    first_seen_run INTEGER REFERENCES runs(id),
+    last_seen_run INTEGER REFERENCES runs(id)
+);
+CREATE INDEX IF NOT EXISTS posts_taken_at ON posts(taken_at);
+CREATE INDEX IF NOT EXISTS posts_event_type ON posts(event_type);
+CREATE TABLE IF NOT EXISTS images (
+    path TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    post_fingerprint TEXT REFERENCES posts(fingerprint),
+    run_id INTEGER REFERENCES runs(id)
+);
+CREATE INDEX IF NOT EXISTS images_post ON images(post_fingerprint);
+CREATE INDEX IF NOT EXISTS images_url ON images(url);
+CREATE TABLE IF NOT EXISTS download_state (
+    url TEXT PRIMARY KEY,
+    state TEXT,
+    sha256 TEXT,
+    size INTEGER,
+    updated_at TEXT,
+    run_id INTEGER REFERENCES runs(id)
+);
+CREATE INDEX IF NOT EXISTS download_state_sha256 ON download_state(sha256);
+CREATE INDEX IF NOT EXISTS download_state_state ON download_state(state);
+"""
+
+# Full-text index over posts, kept in step by triggers so it grows with each batch of upserts
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE posts_fts USING fts5(
+    content, event_type, content='posts', content_rowid='rowid', tokenize='porter unicode61'
+);
+CREATE TRIGGER posts_fts_insert AFTER INSERT ON posts BEGIN
+    INSERT INTO posts_fts(rowid, content, event_type) VALUES (new.rowid, new.content, new.event_type);
+END;
+CREATE TRIGGER posts_fts_delete AFTER DELETE ON posts BEGIN
+    INSERT INTO posts_fts(posts_fts, rowid, content, event_type) VALUES ('delete', old.rowid, old.content, old.event_type);
+END;
+CREATE TRIGGER posts_fts_update AFTER UPDATE OF content, event_type ON posts BEGIN
+    INSERT INTO posts_fts(posts_fts, rowid, content, event_type) VALUES ('delete', old.rowid, old.content, old.event_type);
+    INSERT INTO posts_fts(rowid, content, event_type) VALUES (new.rowid, new.content, new.event_type);
+END;
+INSERT INTO posts_fts(posts_fts) VALUES ('rebuild');
+"""
+
+SEARCH_LIMIT = 100
+
+UPSERT_POST = """
+INSERT INTO posts (fingerprint, date, time, taken_at, event_type, content, image_count, first_seen_run, last_seen_run)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(fingerprint) DO UPDATE SET image_count = excluded.image_count, last_seen_run = excluded.last_seen_run
+"""
+UPSERT_IMAGE = """
+INSERT INTO images (path, url, post_fingerprint, run_id) VALUES (?, ?, ?, ?)
+ON CONFLICT(path) DO UPDATE SET url = excluded.url, run_id = excluded.run_id
+"""
+UPSERT_DOWNLOAD_STATE = """
+INSERT INTO download_state (url, state, sha256, size, updated_at, run_id) VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT(url) DO UPDATE SET state = excluded.state, sha256 = COALESCE(excluded.sha256, sha256),
+    size = COALESCE(excluded.size, size), updated_at = excluded.updated_at, run_id = excluded.run_id
+"""
+
+
+def open_catalog(path):
+    """Open a catalog connection in WAL mode, creating the tables if needed"""
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    has_fts = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'posts_fts'").fetchone()
+    if not has_fts:
+        try:
+            # Also backfills posts written before the index existed
+            conn.executescript(FTS_SCHEMA)
+        except sqlite3.OperationalError:
+            pass  # SQLite built without FTS5 - search_posts falls back to LIKE
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _fts_query(words):
+    """FTS5 query where every word must match, as a prefix ('paint' finds 'painting')"""
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def search_posts(conn, text, limit=SEARCH_LIMIT):
+    """
+    Posts matching every word of text, best match first, each with its image paths
+    Returns a list of dicts: fingerprint, date, time, event_type, content, snippet, images
+    """
+    words = re.findall(r'\w+', text)
+    if not words:
+        return []
+    try:
+        rows = conn.execute(
+            "SELECT posts.fingerprint, posts.date, posts.time, posts.event_type, posts.content, "
+            "snippet(posts_fts, 0, '[', ']', '...', 12) AS snippet "
+            "FROM posts_fts JOIN posts ON posts.rowid = posts_fts.rowid "
+            "WHERE posts_fts MATCH ? ORDER BY bm25(posts_fts) LIMIT ?", (_fts_query(words), limit)).fetchall()
+    except sqlite3.OperationalError:
+        # No FTS5 - slower substring match on the first word
+        pattern = f"%{words[0]}%"
+        rows = conn.execute(
+            "SELECT fingerprint, date, time, event_type, content, content AS snippet FROM posts "
+            "WHERE content LIKE ? OR event_type LIKE ? ORDER BY taken_at DESC LIMIT ?",
+            (pattern, pattern, limit)).fetchall()
+
+    results = [dict(row) for row in rows]
+    if results:
+        by_fingerprint = {result['fingerprint']: result for result in results}
+        for result in results:
+            result['images'] = []
+        placeholders = ','.join('?' * len(by_fingerprint))
+        for row in conn.execute(
+                f"SELECT post_fingerprint, path FROM images WHERE post_fingerprint IN ({placeholders}) "
+                "ORDER BY path", list(by_fingerprint)):
+            by_fingerprint[row['post_fingerprint']]['images'].append(row['path'])
+    return results
+
+
+def search_catalogs(paths, text, limit=SEARCH_LIMIT):
+    """
+    search_posts across several catalogs (e.g. the Full and Test runs'), earlier catalogs first
+    A post found in more than one is listed once, with the image paths from all of them
+    """
+    merged = {}
+    for path in paths:
+        conn = open_catalog(path)
+        try:
+            results = search_posts(conn, text, limit)
+        finally:
+            conn.close()
+        for result in results:
+            existing = merged.get(result['fingerprint'])
+            if existing:
+                existing['images'] += [image for image in result['images'] if image not in existing['images']]
+            else:
+                merged[result['fingerprint']] = result
+    return list(merged.values())[:limit]
+
+
+class Catalog:
+    """
+    Writer for one catalog database, fed from the scrape and the download pipeline
+    Writes are queued and committed by a single thread CATALOG_BATCH_SIZE at a time; reads use
+    their own connections, which WAL mode lets run alongside the writer
+    """
+
+    def __init__(self, path, mode, image_store=None, log=print):
+        self.path = Path(path)
+        self.image_store = image_store
+        self.log = log
+        self.conn = open_catalog(self.path)
+        with self.conn:
+            cursor = self.conn.execute(
+                "INSERT INTO runs (mode, started_at, status) VALUES (?, ?, 'running')",
+                (mode, time.strftime('%Y-%m-%dT%H:%M:%S')))
+        self.run_id = cursor.lastrowid
+        self.queue = queue.Queue()
+        self._closed = False
+        self._thread = threading.Thread(target=self._writer, daemon=True)
+        self._thread.start()
+
+    def add_post(self, post_data):
+        """Record (or refresh) one extracted post"""
+        taken_at = parse_post_datetime(post_data.get('date', ''), post_data.get('time', ''))
+        self.queue.put((UPSERT_POST, (
+            post_fingerprint(post_data),
+            post_data.get('date', ''),
+            post_data.get('time', ''),
+            taken_at.isoformat() if taken_at else None,
+            post_data.get('event_type', ''),
+            post_data.get('content', ''),
+            len(post_data.get('image_urls', [])) + len(post_data.get('video_urls', [])),
+            self.run_id,
+            self.run_id,
+        )))
+
+    def on_downloaded(self, url, dest_path, result, fingerprint, post_data):
+        """Listener: record where an image landed and its download state"""
+        entry = self.image_store.lookup(url) if self.image_store and result != 'failed' else None
+        now = time.strftime('%Y-%m-%dT%H:%M:%S')
+        if result != 'failed':
+            self.queue.put((UPSERT_IMAGE, (str(dest_path), url, fingerprint, self.run_id)))
+        self.queue.put((UPSERT_DOWNLOAD_STATE, (
+            url, result,
+            entry['sha256'] if entry else None,
+            entry.get('size') if entry else None,
+            now, self.run_id,
+        )))
+
+    def _writer(self):
+        """Commit queued statements in batches until the close sentinel arrives"""
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + CATALOG_FLUSH_SECONDS
+            while batch[-1] is not None and len(batch) < CATALOG_BATCH_SIZE:
+                try:
+                    batch.append(self.queue.get(timeout=max(0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            statements = [item for item in batch if item is not None]
+            if statements:
+                try:
+                    with self.conn:
+                        for sql, params in statements:
+                            self.conn.execute(sql, params)
+                except sqlite3.Error as e:
+                    self.log(f"Catalog write failed: {str(e)[:80]}")
+            for _ in batch:
+                self.queue.task_done()
+            if batch[-1] is None:
+                return
+
+    def flush(self):
+        """Block until everything queued so far is committed (e.g. before reading it back)"""
+        self.queue.join()
+
+    def close(self, status='complete', posts=0, counts=None):
+        """Flush outstanding writes and record how the run ended"""
+        if self._closed:
+            return
+        self._closed = True
+        self.queue.put(None)
+        self._thread.join()
+        counts = counts or {}
+        with self.conn:
+            self.conn.execute(
+                "UPDATE runs SET finished_at = ?, status = ?, posts = ?, images_downloaded = ?, "
+                "images_linked = ?, images_failed = ? WHERE id = ?",
+                (time.strftime('%Y-%m-%dT%H:%M:%S'), status, posts,
+                 counts.get('downloaded', 0) + counts.get('updated', 0),
+                 counts.get('linked', 0) + counts.get('unchanged', 0),
+                 counts.get('failed', 0), self.run_id))
+        self.conn.close()
@@ -0,0 +1,198 @@
+"""
+Offline-first ChromeDriver resolution for Parenta Scraper
+The installed Chrome's version is read locally and matched against drivers cached per major
+version in the image store folder; webdriver-manager (and so the network) is only used on a cache
+miss or when a refresh is asked for, so starting the browser is quick and works offline
+"""
+import json
+import os
+import platform
+import plistlib
+import re
+import shutil
+import subprocess
+import time
+from pathlib import Path
+
+from image_store import default_store_root
+
+DRIVER_CACHE_DIR_NAME = "chromedriver"
+DRIVER_INDEX_NAME = "drivers.json"
+VERSION_COMMAND_TIMEOUT = 10  # Seconds allowed for `<binary> --version`
+
+# Drivers that may already be installed, tried when nothing is cached and the download fails
+SYSTEM_DRIVER_PATHS = [
+    "/usr/bin/chromedriver",            # Linux/WSL2 package
+    "/usr/lib/chromium/chromedriver",   # Debian Chromium
+    "C:\\chromedriver.exe",             # Windows manual install
+]
+
+_VERSION_PATTERN = re.compile(r'\d+\.\d+\.\d+\.\d+')
+
+
+def parse_version(text):
+    """First a.b.c.d version number in text, or None"""
+    match = _VERSION_PATTERN.search(text or '')
+    return match.group(0) if match else None
+
+
+def major_of(version):
+    return int(version.split('.')[0]) if version else None
+
+
+def _version_output(binary):
+    """stdout of `binary --version`, or '' if it can't be run"""
+    try:
+        result = subprocess.run([binary, '--version'], capture_output=True, text=True,
+                                timeout=VERSION_COMMAND_TIMEOUT,
+                                creationflags=getattr(subprocess, 'CREATE_NO_WINDOW', 0))
+        return result.stdout
+    except (OSError, subprocess.SubprocessError):
+        return ''
+
+
+def driver_version(driver_path):
+    """Version a chromedriver binary reports, e.g. '126.0.6478.126'"""
+    return parse_version(_version_output(driver_path))
+
+
+def _windows_chrome_version(chrome_binary):
+    # Installs keep a folder named after the version next to chrome.exe
+    if chrome_binary:
+        try:
+            versions = [entry.name for entry in os.scandir(Path(chrome_binary).parent)
+                        if entry.is_dir() and _VERSION_PATTERN.fullmatch(entry.name)]
+        except OSError:
+            versions = []
+        if versions:
+            return max(versions, key=lambda version: tuple(map(int, version.split('.'))))
+    # chrome.exe --version opens a browser window on Windows, so fall back to the registry
+    import winreg
+    for hive in (winreg.HKEY_CURRENT_USER, winreg.HKEY_LOCAL_MACHINE):
+        try:
+            with winreg.OpenKey(hive, r"Software\Google\Chrome\BLBeacon") as key:
+                return parse_version(winreg.QueryValueEx(key, 'version')[0])
+        except OSError:
+            continue
+    return None
+
+
+def detect_chrome_version(chrome_binary=None):
+    """Installed Chrome's full version, read locally (no network), or None"""
+    system = platform.system().lower()
+    if system == 'windows':
+        return _windows_chrome_version(chrome_binary)
+    if not chrome_binary:
+        return None
+    if system == 'darwin':
+        # .../Google Chrome.app/Contents/MacOS/Google Chrome -> .../Contents/Info.plist
+        try:
+            with open(Path(chrome_binary).parents[1] / 'Info.plist', 'rb') as f:
+                return parse_version(plistlib.load(f).get('CFBundleShortVersionString'))
+        except (OSError, ValueError, IndexError):
+            pass
+    return parse_version(_version_output(chrome_binary))
+
+
+class ChromeDriverCache:
+    """
+    ChromeDriver binaries kept under <store>/chromedriver/<major>/, with drivers.json as the index
+    resolve() returns a driver path without touching the network whenever the cache can answer
+    """
+
+    def __init__(self, root=None, log=print):
+        self.root = Path(root) if root else default_store_root() / DRIVER_CACHE_DIR_NAME
+        self.index_path = self.root / DRIVER_INDEX_NAME
+        self.log = log
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                self.index = json.load(f)
+        except (OSError, ValueError):
+            self.index = {}
+
+    def _save(self):
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = self.index_path.with_name(self.index_path.name + ".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.index, f, indent=1)
+        os.replace(tmp_path, self.index_path)
+
+    def cached(self, major):
+        """Cached driver for a Chrome major version, or None"""
+        entry = self.index.get(str(major))
+        if entry and os.path.isfile(entry['path']):
+            return entry['path']
+        return None
+
+    def newest(self):
+        """Cached driver with the highest major version, or None"""
+        for major in sorted(self.index, key=int, reverse=True):
+            path = self.cached(major)
+            if path:
+                return path
+        return None
+
+    def resolve(self, chrome_binary=None, refresh=False):
+        """
+        Path to a ChromeDriver matching the installed Chrome, or None if none could be found
+        Order: cache (by locally detected major version), download on a miss or refresh, then any
+        installed driver of the right version, then the newest cached driver as a last resort
+        """
+        version = detect_chrome_version(chrome_binary)
+        major = major_of(version)
+        self.log(f"Chrome version: {version or 'unknown'}")
+
+        if not refresh:
+            path = self.cached(major) if major else self.newest()
+            if path:
+                self.log(f"Using cached ChromeDriver for Chrome {major or 'latest'} (no download needed)")
+                return path
+
+        path = self._download(major)
+        if path:
+            return path
+
+        candidates = [shutil.which('chromedriver')] + SYSTEM_DRIVER_PATHS
+        for candidate in candidates:
+            if candidate and os.path.isfile(candidate) and major in (None, major_of(driver_version(candidate))):
+                self.log(f"Using installed ChromeDriver at: {candidate}")
+                return candidate
+        path = self.newest()
+        if path:
+            self.log(f"⚠ No ChromeDriver for Chrome {major} available offline - trying cached {path}")
+        return path
+
+    def _download(self, major):
+        """Fetch a driver with webdriver-manager and file it in the cache under its own major version"""
+        try:
+            from webdriver_manager.chrome import ChromeDriverManager
+
+            self.log("Downloading ChromeDriver...")
+            downloaded = ChromeDriverManager().install()
+        except Exception as e:
+            self.log(f"ChromeDriver download failed: {str(e)[:200]}")
+            return None
+
+        version = driver_version(downloaded)
+        driver_major = major_of(version) or major
+        if driver_major is None:
+            return downloaded
+        if major and driver_major != major:
+            self.log(f"⚠ Downloaded ChromeDriver {version} but Chrome is version {major}")
+        target = self.root / str(driver_major) / Path(downloaded).name
+        try:
+            os.makedirs(target.parent, exist_ok=True)
+            tmp_path = target.with_name(target.name + ".tmp")
+            shutil.copy2(downloaded, tmp_path)
+            os.replace(tmp_path, target)
+        except OSError as e:
+            self.log(f"Could not cache ChromeDriver: {e}")
+            return downloaded
+        self.index[str(driver_major)] = {
+            'path': str(target),
+            'version': version,
+            'cached_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        }
+        self._save()
+        self.log(f"ChromeDriver {version or ''} cached for offline use")
+        return str(target)
@@ -0,0 +1,589 @@
+"""
+HTTP download engine for Parenta Scraper
+Fetches images and videos into the content-addressed store with conditional revalidation
+"""
+import concurrent.futures
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from batch_extractor import is_video_url
+from image_store import canonical_url
+from run_control import RunControl, ScrapeCancelled
+
+# Number of parallel connections used when revalidating the whole library
+VERIFY_WORKERS = 32
+
+# Download workers and how many queued images the scraper may run ahead by
+DOWNLOAD_WORKERS = 5
+MAX_QUEUED_DOWNLOADS = 500
+
+# Attempts per image before it is written to the failure log, and the backoff between them
+DOWNLOAD_ATTEMPTS = 3
+RETRY_BACKOFF_SECONDS = 2
+
+FAILURE_LOG_NAME = "failed_downloads.json"
+
+# Read size for response bodies and buffer size for writes to disk
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+# Media larger than this is fetched as parallel Range requests instead of one long stream
+PARALLEL_DOWNLOAD_THRESHOLD = 16 * 1024 * 1024
+RANGE_PART_SIZE = 4 * 1024 * 1024
+RANGE_WORKERS = 4
+
+
+def create_session(pool_size=10):
+    """Requests session with a connection pool big enough for the worker count"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def validator_headers(entry):
+    """Conditional request headers built from the validators stored in a manifest entry"""
+    headers = {}
+    if entry.get('etag'):
+        headers['If-None-Match'] = entry['etag']
+    if entry.get('last_modified'):
+        headers['If-Modified-Since'] = entry['last_modified']
+    return headers
+
+
+def response_validators(response):
+    """ETag/Last-Modified from a response, in manifest entry form"""
+    validators = {}
+    if response.headers.get('ETag'):
+        validators['etag'] = response.headers['ETag']
+    if response.headers.get('Last-Modified'):
+        validators['last_modified'] = response.headers['Last-Modified']
+    return validators
+
+
+def _partial_meta_path(partial_path):
+    """Sidecar file holding the validators of the response a partial file came from"""
+    return partial_path.with_name(partial_path.name + ".json")
+
+
+def _discard_partial(partial_path):
+    """Remove a partial download and its sidecar"""
+    partial_path.unlink(missing_ok=True)
+    _partial_meta_path(partial_path).unlink(missing_ok=True)
+
+
+def _resume_headers(partial_path):
+    """Range/If-Range headers to continue a partial download, or {} to start over"""
+    try:
+        offset = partial_path.stat().st_size
+        with open(_partial_meta_path(partial_path), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    validator = meta.get('etag') or meta.get('last_modified')
+    if offset <= 0 or not validator:
+        return {}
+    # If-Range makes the server send the whole file if it changed since the partial was written
+    return {'Range': f"bytes={offset}-", 'If-Range': validator}
+
+
+def expected_length(response, offset):
+    """Total object size promised by the server, or None if it didn't say"""
+    content_range = response.headers.get('Content-Range', '')
+    if response.status_code == 206 and '/' in content_range:
+        total = content_range.rsplit('/', 1)[-1]
+        return int(total) if total.isdigit() else None
+    length = response.headers.get('Content-Length')
+    if length and length.isdigit() and 'Content-Encoding' not in response.headers:
+        return int(length) + offset
+    return None
+
+
+def etag_md5(etag):
+    """Object stores like Rackspace Cloud Files use the body's MD5 as a strong ETag"""
+    if not etag or etag.startswith('W/'):
+        return None
+    value = etag.strip('"').lower()
+    if len(value) == 32 and all(c in '0123456789abcdef' for c in value):
+        return value
+    return None
+
+
+def _store_response(image_store, url, response, partial_path, offset):
+    """
+    Stream a response body into the URL's partial file, then verify and file it in the store
+    A 206 appends to the existing partial; anything else starts it again from zero
+    """
+    sha256 = hashlib.sha256()
+    md5 = hashlib.md5()
+    if response.status_code == 206 and offset:
+        # Resuming: fold the bytes we already have into the digests
+        with open(partial_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(WRITE_BUFFER_SIZE), b''):
+                sha256.update(chunk)
+                md5.update(chunk)
+        mode = 'ab'
+    else:
+        offset = 0
+        mode = 'wb'
+
+    validators = response_validators(response)
+    with open(_partial_meta_path(partial_path), 'w', encoding='utf-8') as f:
+        json.dump(validators, f)
+
+    with open(partial_path, mode, buffering=WRITE_BUFFER_SIZE) as f:
+        for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+            f.write(chunk)
+            sha256.update(chunk)
+            md5.update(chunk)
+
+    # Integrity checks before the file is allowed into the store
+    size = partial_path.stat().st_size
+    expected = expected_length(response, offset)
+    if expected is not None and size != expected:
+        if size > expected:
+            _discard_partial(partial_path)
+        raise IOError(f"incomplete download: got {size} of {expected} bytes")
+    expected_md5 = etag_md5(validators.get('etag'))
+    if expected_md5 and md5.hexdigest() != expected_md5:
+        _discard_partial(partial_path)
+        raise IOError("checksum mismatch against server ETag")
+
+    _partial_meta_path(partial_path).unlink(missing_ok=True)
+    validators['verified_at'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+    return image_store.add_file(url, partial_path, sha256=sha256.hexdigest(), extra=validators)
+
+
+class RangeNotSupported(IOError):
+    """The server answered a Range request with the whole file"""
+
+
+def probe_media(session, url, timeout=15):
+    """HEAD request returning (size, supports_ranges, validators) for a media URL"""
+    response = session.head(url, allow_redirects=True, timeout=timeout)
+    response.raise_for_status()
+    length = response.headers.get('Content-Length', '')
+    size = int(length) if length.isdigit() else 0
+    supports_ranges = response.headers.get('Accept-Ranges', '').lower() == 'bytes'
+    return size, supports_ranges, response_validators(response)
+
+
+def _load_chunk_state(state_path, size, validator):
+    """Finished part offsets from a previous attempt, if it was for the same file version"""
+    try:
+        with open(state_path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        if state.get('size') == size and state.get('validator') == validator:
+            return set(state.get('done', []))
+    except (OSError, ValueError):
+        pass
+    return set()
+
+
+def download_ranges(session, image_store, url, size, validators, progress_callback=None, timeout=30):
+    """
+    Download a large file as parallel Range requests into a preallocated temp file
+    Finished parts are recorded so an interrupted download only refetches missing parts
+    """
+    chunk_path = image_store.partial_path(url, suffix=".chunked")
+    state_path = chunk_path.with_name(chunk_path.name + ".json")
+    validator = validators.get('etag') or validators.get('last_modified')
+    done = _load_chunk_state(state_path, size, validator) if chunk_path.exists() else set()
+
+    if not done:
+        # Preallocate so each part can be written at its own offset
+        with open(chunk_path, 'wb') as f:
+            f.truncate(size)
+
+    starts = list(range(0, size, RANGE_PART_SIZE))
+    lock = threading.Lock()
+    progress = {'bytes': sum(min(RANGE_PART_SIZE, size - start) for start in done)}
+
+    def save_state():
+        with open(state_path, 'w', encoding='utf-8') as f:
+            json.dump({'size': size, 'validator': validator, 'done': sorted(done)}, f)
+
+    def fetch_part(start):
+        if progress_callback:
+            # Also gives the callback a chance to abort (e.g. on cancel) before each part starts
+            progress_callback(progress['bytes'], size)
+        end = min(start + RANGE_PART_SIZE, size) - 1
+        headers = {'Range': f"bytes={start}-{end}"}
+        if validator:
+            headers['If-Range'] = validator
+        with session.get(url, headers=headers, stream=True, timeout=timeout) as response:
+            response.raise_for_status()
+            if response.status_code != 206:
+                raise RangeNotSupported("server ignored the Range request or the file changed")
+            with open(chunk_path, 'r+b') as f:
+                f.seek(start)
+                written = 0
+                for data in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                    f.write(data)
+                    written += len(data)
+        if written != end - start + 1:
+            raise IOError(f"short range {start}-{end}: got {written} bytes")
+        with lock:
+            done.add(start)
+            progress['bytes'] += written
+            save_state()
+            if progress_callback:
+                progress_callback(progress['bytes'], size)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=RANGE_WORKERS) as executor:
+        # list() re-raises the first failed part; finished parts stay recorded for the retry
+        list(executor.map(fetch_part, [start for start in starts if start not in done]))
+
+    # Whole-file integrity check before the file is allowed into the store
+    sha256 = hashlib.sha256()
+    md5 = hashlib.md5()
+    with open(chunk_path, 'rb') as f:
+        for data in iter(lambda: f.read(WRITE_BUFFER_SIZE), b''):
+            sha256.update(data)
+            md5.update(data)
+    expected_md5 = etag_md5(validators.get('etag'))
+    if expected_md5 and md5.hexdigest() != expected_md5:
+        chunk_path.unlink(missing_ok=True)
+        state_path.unlink(missing_ok=True)
+        raise IOError("checksum mismatch against server ETag")
+
+    state_path.unlink(missing_ok=True)
+    extra = dict(validators)
+    extra['verified_at'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+    return image_store.add_file(url, chunk_path, sha256=sha256.hexdigest(), extra=extra)
+
+
+def download_to_store(session, image_store, url, entry=None, timeout=15, progress_callback=None):
+    """
+    Download url into the store via a temp file, resuming a previous partial if there is one
+    With a manifest entry, the request is conditional; returns None on 304 Not Modified
+    Large videos are split into parallel Range requests; if the HEAD probe or the Range
+    requests are refused, they fall back to one plain GET
+    """
+    if is_video_url(url):
+        try:
+            size, supports_ranges, validators = probe_media(session, url, timeout)
+        except requests.RequestException:
+            size, supports_ranges, validators = 0, False, {}  # e.g. 403/405 for HEAD only
+        if entry and validators and all(entry.get(k) == v for k, v in validators.items()):
+            return None
+        if supports_ranges and size > PARALLEL_DOWNLOAD_THRESHOLD:
+            try:
+                return download_ranges(session, image_store, url, size, validators, progress_callback)
+            except RangeNotSupported:
+                chunk_path = image_store.partial_path(url, suffix=".chunked")
+                chunk_path.unlink(missing_ok=True)
+                chunk_path.with_name(chunk_path.name + ".json").unlink(missing_ok=True)
+
+    partial_path = image_store.partial_path(url)
+    headers = validator_headers(entry) if entry else {}
+    resume = _resume_headers(partial_path)
+    headers.update(resume)
+    offset = partial_path.stat().st_size if resume else 0
+
+    with session.get(url, headers=headers, stream=True, timeout=timeout) as response:
+        if entry and response.status_code == 304:
+            return None
+        if response.status_code == 416:
+            # Our partial is no longer a valid prefix - start again next time
+            _discard_partial(partial_path)
+        response.raise_for_status()
+        return _store_response(image_store, url, response, partial_path, offset)
+
+
+def fetch_image(session, image_store, url, dest_path, revalidate=False, timeout=15, progress_callback=None):
+    """
+    Place one image at dest_path, downloading it only if needed
+    Known URLs are linked straight from the store; with revalidate=True a conditional
+    request is sent first so unchanged images cost a 304
+    Returns (result, path): result is 'linked', 'unchanged', 'updated' or 'downloaded', and
+    path is where the image landed (dest_path, unless the stored copy was transcoded)
+    """
+    with image_store.url_lock(url):
+        return _fetch_image_locked(session, image_store, url, dest_path, revalidate, timeout, progress_callback)
+
+
+def _fetch_image_locked(session, image_store, url, dest_path, revalidate, timeout, progress_callback):
+    """fetch_image body, run while holding the URL's lock"""
+    entry = image_store.lookup(url)
+    if entry and not revalidate:
+        return 'linked', image_store.link(entry, dest_path)
+
+    # The store updates entries in place, so remember what we had before downloading
+    previous_sha256 = entry['sha256'] if entry else None
+    new_entry = download_to_store(session, image_store, url, entry, timeout, progress_callback)
+    if new_entry is None:
+        image_store.touch_verified(url)
+        return 'unchanged', image_store.link(entry, dest_path)
+
+    linked_path = image_store.link(new_entry, dest_path)
+    if entry is None:
+        return 'downloaded', linked_path
+    if new_entry['sha256'] != previous_sha256:
+        image_store.relink_all(new_entry)
+        return 'updated', linked_path
+    return 'unchanged', linked_path
+
+
+def revalidate_entry(session, image_store, entry, timeout=15):
+    """
+    Revalidate one manifest entry with a conditional GET
+    Replaced photos are re-downloaded and every linked copy is pointed at the new content
+    """
+    url = entry['url']
+    with image_store.url_lock(url):
+        new_entry = download_to_store(session, image_store, url, entry, timeout)
+    if new_entry is None:
+        image_store.touch_verified(url)
+        return 'unchanged'
+
+    if new_entry['sha256'] != entry.get('sha256'):
+        image_store.relink_all(new_entry)
+        return 'updated'
+    return 'unchanged'
+
+
+def revalidate_library(image_store, workers=VERIFY_WORKERS, progress_callback=None):
+    """
+    Revalidate every image in the manifest in parallel
+    Returns a dict of counts: unchanged, updated, failed
+    """
+    entries = image_store.all_entries()
+    counts = {'unchanged': 0, 'updated': 0, 'failed': 0}
+    session = create_session(workers)
+
+    def check(entry):
+        try:
+            return revalidate_entry(session, image_store, entry)
+        except Exception as e:
+            return f"failed: {str(e)[:80]}"
+
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            for done, result in enumerate(executor.map(check, entries), start=1):
+                if result in counts:
+                    counts[result] += 1
+                else:
+                    counts['failed'] += 1
+                if progress_callback and (done % 200 == 0 or done == len(entries)):
+                    progress_callback(done, len(entries), counts)
+    finally:
+        session.close()
+        image_store.save()
+
+    return counts
+
+
+class FailureLog:
+    """
+    Persistent dead-letter list of images that failed every download attempt
+    Entries survive restarts so they can be retried later without re-scraping
+    """
+
+    def __init__(self, image_store):
+        self.path = image_store.root / FAILURE_LOG_NAME
+        self._lock = threading.Lock()
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.failures = json.load(f)
+        except FileNotFoundError:
+            self.failures = {}
+        except Exception as e:
+            print(f"Could not read failure log {self.path}: {e}")
+            self.failures = {}
+
+    @staticmethod
+    def _key(url, dest_path):
+        return f"{canonical_url(url)}|{dest_path}"
+
+    def record(self, url, dest_path, fingerprint, error, attempts, post_data=None):
+        """Add or update a failed image"""
+        with self._lock:
+            key = self._key(url, dest_path)
+            previous = self.failures.get(key, {})
+            self.failures[key] = {
+                'url': url,
+                'target': str(dest_path),
+                'post_fingerprint': fingerprint or previous.get('post_fingerprint', ''),
+                'error': str(error)[:300],
+                'attempts': previous.get('attempts', 0) + attempts,
+                'failed_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                # Enough of the post to date-stamp the image once it does download
+                'post': {field: (post_data or {}).get(field, '') for field in ('date', 'time', 'event_type')}
+                        if post_data else previous.get('post'),
+            }
+
+    def resolve(self, url, dest_path):
+        """Drop an image from the log once it has downloaded"""
+        with self._lock:
+            self.failures.pop(self._key(url, dest_path), None)
+
+    def entries(self):
+        """Snapshot of all outstanding failures"""
+        with self._lock:
+            return list(self.failures.values())
+
+    def save(self):
+        """Write the log atomically"""
+        with self._lock:
+            tmp_path = self.path.with_suffix('.json.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.failures, f, indent=1)
+            os.replace(tmp_path, self.path)
+
+
+class DownloadPipeline:
+    """
+    Bounded producer-consumer download queue
+    The scraper submits images as soon as posts are discovered while workers download in the
+    background; submit() blocks when the queue is full so memory stays bounded
+    A RunControl pauses the workers between images; once it is cancelled, queued images are
+    skipped (and kept in the failure log) so close() returns within a download or two
+    """
+
+    def __init__(self, image_store, workers=DOWNLOAD_WORKERS, max_queued=MAX_QUEUED_DOWNLOADS,
+                 revalidate=False, log=print, control=None):
+        self.image_store = image_store
+        self.revalidate = revalidate
+        self.log = log
+        self.control = control or RunControl()
+        self.session = create_session(workers + RANGE_WORKERS)  # Room for a chunked video download
+        self.queue = queue.Queue(maxsize=max_queued)
+        self.failure_log = FailureLog(image_store)
+        self.counts = {'downloaded': 0, 'linked': 0, 'unchanged': 0, 'updated': 0, 'failed': 0, 'cancelled': 0}
+        self.submitted = 0
+        self.bytes_downloaded = 0
+        self._lock = threading.Lock()
+        self._closed = False
+        self._listeners = []
+        self._threads = []
+        for i in range(workers):
+            thread = threading.Thread(target=self._worker, name=f"download-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, url, dest_path, fingerprint=None, post_data=None):
+        """Queue one image; blocks while the workers are MAX_QUEUED_DOWNLOADS behind"""
+        with self._lock:
+            self.submitted += 1
+        self.queue.put((url, dest_path, fingerprint, post_data))
+
+    def add_listener(self, callback):
+        """
+        Call callback(url, dest_path, result, fingerprint, post_data) after each image finishes
+        Runs on the download worker thread, so listeners should hand heavy work off elsewhere
+        """
+        self._listeners.append(callback)
+
+    def join(self):
+        """Block until everything submitted so far has been downloaded (workers keep running)"""
+        self.queue.join()
+
+    @property
+    def completed(self):
+        """Number of images finished so far (successfully or not)"""
+        with self._lock:
+            return sum(self.counts.values())
+
+    def _worker(self):
+        """Pull images off the queue until the end-of-work sentinel arrives"""
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    return
+                url, dest_path, fingerprint, post_data = item
+                self.control.wait_while_paused()
+                if self.control.cancelled:
+                    # Never started - kept in the failure log so "Retry Failures" can fetch it later
+                    self.failure_log.record(url, dest_path, fingerprint, "cancelled", 0, post_data)
+                    result = 'cancelled'
+                else:
+                    result, linked_path = self._download_with_retries(url, dest_path, fingerprint, post_data)
+                # Listeners only hear about images that were actually attempted, at the path they
+                # landed on (a transcoded copy keeps its own extension)
+                if result != 'cancelled':
+                    for listener in self._listeners:
+                        try:
+                            listener(url, linked_path, result, fingerprint, post_data)
+                        except Exception as e:
+                            self.log(f"Download listener failed: {str(e)[:80]}")
+                entry = self.image_store.lookup(url) if result in ('downloaded', 'updated') else None
+                with self._lock:
+                    self.counts[result] += 1
+                    done = sum(self.counts.values())
+                    if entry:
+                        self.bytes_downloaded += entry.get('size', 0)
+                if done % 50 == 0:
+                    self.log(f"Downloaded {done} images so far ({self.queue.qsize()} waiting)")
+            finally:
+                self.queue.task_done()
+
+    def _progress_logger(self, dest_path):
+        """Progress callback for large media that logs roughly every 10%"""
+        last_reported = [0]
+
+        def report(done_bytes, total_bytes):
+            if self.control.cancelled:
+                raise ScrapeCancelled()  # Finished parts are kept, so a later run resumes
+            percent = int(done_bytes * 100 / total_bytes) if total_bytes else 100
+            if percent >= last_reported[0] + 10 or done_bytes == total_bytes:
+                last_reported[0] = percent
+                self.log(f"  {dest_path.name}: {percent}% of {total_bytes / (1024 * 1024):.0f} MB")
+        return report
+
+    def _download_with_retries(self, url, dest_path, fingerprint, post_data):
+        """
+        Try an image a few times with backoff; permanent failures go to the failure log
+        Returns (result, path the image was linked at - dest_path if it wasn't)
+        """
+        for attempt in range(1, DOWNLOAD_ATTEMPTS + 1):
+            try:
+                result, linked_path = fetch_image(self.session, self.image_store, url, dest_path,
+                                                  revalidate=self.revalidate,
+                                                  progress_callback=self._progress_logger(dest_path))
+                self.failure_log.resolve(url, dest_path)
+                return result, linked_path
+            except ScrapeCancelled as e:
+                error = e  # Raised by the progress callback mid-download
+            except requests.HTTPError as e:
+                # 4xx won't get better by retrying (expired or removed URL)
+                status = e.response.status_code if e.response is not None else 0
+                if 400 <= status < 500 and status != 429:
+                    error = e
+                    break
+                error = e
+            except Exception as e:
+                error = e
+            if self.control.cancelled:
+                self.failure_log.record(url, dest_path, fingerprint, "cancelled", attempt, post_data)
+                return 'cancelled', dest_path
+            if attempt < DOWNLOAD_ATTEMPTS and self.control.wait(RETRY_BACKOFF_SECONDS * attempt):
+                self.failure_log.record(url, dest_path, fingerprint, "cancelled", attempt, post_data)
+                return 'cancelled', dest_path
+
+        self.log(f"Failed to download {dest_path.name}: {str(error)[:50]}")
+        self.failure_log.record(url, dest_path, fingerprint, error, attempt, post_data)
+        return 'failed', dest_path
+
+    def close(self):
+        """Wait for every queued image, stop the workers and save the manifest"""
+        if self._closed:
+            return dict(self.counts)
+        self._closed = True
+        for _ in self._threads:
+            self.queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self.session.close()
+        self.image_store.save()
+        self.failure_log.save()
+        return dict(self.counts)
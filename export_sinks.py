@@ -0,0 +1,199 @@
+"""
+Streaming post exports for Parenta Scraper
+Each enabled format gets one long-lived buffered writer; every extracted post is fanned out to
+all of them in a single pass, and each flushes on its own size or time threshold - the time one
+when a post arrives or when the scraper calls ExportSinks.flush(stale_only=True) between scroll rounds
+"""
+import csv
+import importlib.util
+import json
+import threading
+import time
+
+from batch_extractor import parse_post_datetime
+from image_store import post_fingerprint
+
+# Optional - Parquet export is hidden without it. Only looked up here; pyarrow itself is slow to
+# import, so it is loaded when a Parquet export is actually opened
+HAS_PYARROW = importlib.util.find_spec('pyarrow') is not None
+
+EXPORT_FLUSH_ROWS = 50  # Rows buffered before a write
+EXPORT_FLUSH_SECONDS = 5.0  # ...or seconds since the last write, whichever comes first
+PARQUET_FLUSH_ROWS = 1000  # Parquet writes one row group per flush, so buffer more
+
+
+def post_record(post_data):
+    """Machine-friendly record of one post, shared by every sink"""
+    taken_at = parse_post_datetime(post_data.get('date', ''), post_data.get('time', ''))
+    return {
+        'fingerprint': post_fingerprint(post_data),
+        'date': post_data.get('date', ''),
+        'time': post_data.get('time', ''),
+        'taken_at': taken_at.isoformat() if taken_at else None,
+        'event_type': post_data.get('event_type', ''),
+        'content': post_data.get('content', ''),
+        'image_count': len(post_data.get('image_urls', [])),
+        'image_urls': list(post_data.get('image_urls', [])),
+        'video_urls': list(post_data.get('video_urls', [])),
+    }
+
+
+class ExportSink:
+    """
+    Base class: buffers records and hands them to _write_rows in batches
+    Subclasses open their file once in _open and release it in _close
+    """
+    extension = None
+    flush_rows = EXPORT_FLUSH_ROWS
+
+    def __init__(self, path):
+        self.path = path
+        self.rows_written = 0
+        self._buffer = []
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self._open()
+
+    def write(self, record):
+        """Buffer one post record, flushing if the buffer is full or stale"""
+        with self._lock:
+            self._buffer.append(record)
+            due = (len(self._buffer) >= self.flush_rows
+                   or time.monotonic() - self._last_flush >= EXPORT_FLUSH_SECONDS)
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Write everything buffered so far"""
+        with self._lock:
+            rows, self._buffer = self._buffer, []
+            self._last_flush = time.monotonic()
+            if rows:
+                self._write_rows(rows)
+                self.rows_written += len(rows)
+
+    def flush_if_stale(self):
+        """Flush rows that have waited EXPORT_FLUSH_SECONDS, even if no new post has arrived"""
+        with self._lock:
+            due = self._buffer and time.monotonic() - self._last_flush >= EXPORT_FLUSH_SECONDS
+        if due:
+            self.flush()
+
+    def close(self):
+        self.flush()
+        self._close()
+
+    def _open(self):
+        raise NotImplementedError
+
+    def _write_rows(self, rows):
+        raise NotImplementedError
+
+    def _close(self):
+        raise NotImplementedError
+
+
+class CsvSink(ExportSink):
+    """The original Nursery_Data CSV: Date, Time, Event_Type, Content, Image_Count"""
+    extension = ".csv"
+
+    def _open(self):
+        self._file = open(self.path, 'w', newline='', encoding='utf-8')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(['Date', 'Time', 'Event_Type', 'Content', 'Image_Count'])
+        self._file.flush()
+
+    def _write_rows(self, rows):
+        self._writer.writerows([
+            [row['date'], row['time'], row['event_type'], row['content'], row['image_count']]
+            for row in rows
+        ])
+        self._file.flush()
+
+    def _close(self):
+        self._file.close()
+
+
+class JsonLinesSink(ExportSink):
+    """One JSON object per post, including ids, parsed timestamps and media URLs"""
+    extension = ".jsonl"
+
+    def _open(self):
+        self._file = open(self.path, 'w', encoding='utf-8')
+
+    def _write_rows(self, rows):
+        self._file.write(''.join(json.dumps(row, ensure_ascii=False) + '\n' for row in rows))
+        self._file.flush()
+
+    def _close(self):
+        self._file.close()
+
+
+class ParquetSink(ExportSink):
+    """Columnar export for pandas/DuckDB; each flush becomes one row group (needs pyarrow)"""
+    extension = ".parquet"
+    flush_rows = PARQUET_FLUSH_ROWS
+
+    def _open(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self._pa = pa
+        self._schema = pa.schema([
+            ('fingerprint', pa.string()),
+            ('date', pa.string()),
+            ('time', pa.string()),
+            ('taken_at', pa.string()),
+            ('event_type', pa.string()),
+            ('content', pa.string()),
+            ('image_count', pa.int32()),
+            ('image_urls', pa.list_(pa.string())),
+            ('video_urls', pa.list_(pa.string())),
+        ])
+        self._writer = pq.ParquetWriter(self.path, self._schema)
+
+    def _write_rows(self, rows):
+        self._writer.write_table(self._pa.Table.from_pylist(rows, schema=self._schema))
+
+    def _close(self):
+        self._writer.close()
+
+
+# GUI name -> sink class; Parquet is only offered when pyarrow is installed
+EXPORT_FORMATS = {"CSV": CsvSink, "JSON Lines": JsonLinesSink}
+if HAS_PYARROW:
+    EXPORT_FORMATS["Parquet"] = ParquetSink
+
+
+class ExportSinks:
+    """Fans each post out to every enabled sink"""
+
+    def __init__(self, base_path, formats):
+        self.sinks = [EXPORT_FORMATS[name](base_path.with_suffix(EXPORT_FORMATS[name].extension))
+                      for name in formats]
+        self._closed = False
+
+    @property
+    def paths(self):
+        return [sink.path for sink in self.sinks]
+
+    def write(self, post_data):
+        record = post_record(post_data)
+        for sink in self.sinks:
+            sink.write(record)
+
+    def flush(self, stale_only=False):
+        """Write out buffered rows - with stale_only, just those past EXPORT_FLUSH_SECONDS"""
+        for sink in self.sinks:
+            if stale_only:
+                sink.flush_if_stale()
+            else:
+                sink.flush()
+
+    def close(self):
+        """Flush and close every sink (safe to call more than once)"""
+        if self._closed:
+            return
+        self._closed = True
+        for sink in self.sinks:
+            sink.close()
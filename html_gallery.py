@@ -0,0 +1,206 @@
+"""
+Offline HTML gallery for Parenta Scraper
+One static page per month built from the catalog, with small pre-made thumbnails that the
+browser loads lazily; only months whose posts or photos changed are rebuilt
+"""
+import concurrent.futures
+import hashlib
+import html
+import json
+import os
+from pathlib import Path
+from urllib.parse import quote
+
+from batch_extractor import is_video_url
+
+GALLERY_DIR_NAME = "Gallery"
+GALLERY_STATE_NAME = "gallery.json"
+THUMBNAIL_SIZE = 320  # Longest edge in pixels
+THUMBNAIL_QUALITY = 70
+THUMBNAIL_WORKERS = 8
+
+PAGE_STYLE = """
+body{font-family:sans-serif;margin:0 auto;max-width:1200px;padding:16px;background:#fafafa;color:#222}
+nav a{margin-right:12px}
+.post{background:#fff;border-radius:8px;margin:16px 0;padding:12px;box-shadow:0 1px 3px #0002}
+.post h3{margin:0 0 4px;font-size:15px}.post p{margin:4px 0 8px;white-space:pre-wrap}
+.tiles{display:flex;flex-wrap:wrap;gap:6px}
+.tiles img{height:160px;border-radius:4px;background:#eee}
+.video{display:inline-block;height:160px;width:160px;line-height:160px;text-align:center;background:#333;color:#fff;border-radius:4px;text-decoration:none}
+"""
+
+
+def _month_of(taken_at):
+    return taken_at[:7] if taken_at else "undated"
+
+
+def _href(path, page_dir):
+    """Relative, URL-quoted link from a page to a file"""
+    return quote(Path(os.path.relpath(path, page_dir)).as_posix())
+
+
+def make_thumbnail(source, thumb_path):
+    """Write a small JPEG thumbnail; returns False if the source can't be decoded"""
+    from PIL import Image, ImageOps
+
+    try:
+        with Image.open(source) as image:
+            image.draft('RGB', (THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+            image = ImageOps.exif_transpose(image).convert('RGB')
+            image.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+            os.makedirs(thumb_path.parent, exist_ok=True)
+            tmp_path = thumb_path.with_name(thumb_path.name + ".part")
+            image.save(tmp_path, 'JPEG', quality=THUMBNAIL_QUALITY)
+        os.replace(tmp_path, thumb_path)
+        return True
+    except Exception:
+        return False
+
+
+class HtmlGallery:
+    """
+    Builds <download folder>/Gallery from a catalog connection
+    gallery.json keeps a signature per month so unchanged pages are left alone
+    """
+
+    def __init__(self, conn, download_dir):
+        self.conn = conn
+        self.root = Path(download_dir) / GALLERY_DIR_NAME
+        self.thumbs_dir = self.root / "thumbs"
+        self.months_dir = self.root / "months"
+        self.state_path = self.root / GALLERY_STATE_NAME
+
+    def _load_state(self):
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _posts_by_month(self):
+        """{month: [post dicts with 'media' lists]}, newest first"""
+        months = {}
+        posts = {}
+        for row in self.conn.execute(
+                "SELECT fingerprint, date, time, taken_at, event_type, content FROM posts "
+                "ORDER BY taken_at DESC, time DESC"):
+            post = dict(row)
+            post['media'] = []
+            posts[post['fingerprint']] = post
+            months.setdefault(_month_of(post['taken_at']), []).append(post)
+        for row in self.conn.execute(
+                "SELECT images.post_fingerprint, images.path, images.url, download_state.sha256 "
+                "FROM images LEFT JOIN download_state ON download_state.url = images.url ORDER BY images.path"):
+            post = posts.get(row['post_fingerprint'])
+            if post:
+                post['media'].append({'path': row['path'], 'url': row['url'], 'sha256': row['sha256']})
+        return months
+
+    def _thumb_path(self, media):
+        key = media['sha256'] or hashlib.sha1(media['path'].encode('utf-8')).hexdigest()
+        return self.thumbs_dir / key[:2] / f"{key}.jpg"
+
+    @staticmethod
+    def _signature(posts, neighbours):
+        """Changes whenever the page would: its posts, their files, or its prev/next links"""
+        digest = hashlib.sha1(json.dumps(neighbours).encode('utf-8'))
+        for post in posts:
+            digest.update(json.dumps([post['fingerprint'], post['content'], post['event_type'],
+                                      [(m['path'], m['sha256']) for m in post['media']]]).encode('utf-8'))
+        return digest.hexdigest()
+
+    def build(self):
+        """
+        Rebuild changed month pages (and their thumbnails) plus the front page
+        Returns (months rebuilt, total months, thumbnails made)
+        """
+        os.makedirs(self.months_dir, exist_ok=True)
+        state = self._load_state()
+        months = self._posts_by_month()
+        ordered = sorted(months, reverse=True)
+        signatures = {
+            month: self._signature(months[month], ordered[max(0, position - 1):position + 2])
+            for position, month in enumerate(ordered)
+        }
+        changed = [month for month in ordered
+                   if state.get(month) != signatures[month]
+                   or not (self.months_dir / f"{month}.html").exists()]
+
+        # Thumbnails for changed months only - content-addressed, so re-posted photos share one
+        wanted = {}
+        for month in changed:
+            for post in months[month]:
+                for media in post['media']:
+                    thumb_path = self._thumb_path(media)
+                    if not is_video_url(media['url']) and not thumb_path.exists() and os.path.exists(media['path']):
+                        wanted[thumb_path] = media['path']
+        with concurrent.futures.ThreadPoolExecutor(max_workers=THUMBNAIL_WORKERS) as executor:
+            made = sum(executor.map(lambda item: make_thumbnail(item[1], item[0]), wanted.items()))
+
+        for month in changed:
+            self._write_month(month, months[month], ordered)
+            state[month] = signatures[month]
+        for month in set(state) - set(months):
+            state.pop(month)
+            for suffix in (".html", ".json"):
+                (self.months_dir / f"{month}{suffix}").unlink(missing_ok=True)
+
+        self._write_front_page(ordered, months)
+        tmp_path = self.state_path.with_name(self.state_path.name + ".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.state_path)
+        return len(changed), len(months), made
+
+    def _write_month(self, month, posts, ordered):
+        """One month's HTML page plus its compact JSON index"""
+        page_dir = self.months_dir
+        position = ordered.index(month)
+        nav = ['<a href="../index.html">All months</a>']
+        if position + 1 < len(ordered):
+            nav.append(f'<a href="{quote(ordered[position + 1])}.html">&larr; {html.escape(ordered[position + 1])}</a>')
+        if position > 0:
+            nav.append(f'<a href="{quote(ordered[position - 1])}.html">{html.escape(ordered[position - 1])} &rarr;</a>')
+
+        parts = [f'<!DOCTYPE html><html><head><meta charset="utf-8"><title>{html.escape(month)}</title>'
+                 f'<style>{PAGE_STYLE}</style></head><body><nav>{"".join(nav)}</nav><h1>{html.escape(month)}</h1>']
+        index = []
+        for post in posts:
+            parts.append(f'<div class="post"><h3>{html.escape(post["date"] or "")} {html.escape(post["time"] or "")}'
+                         f' &middot; {html.escape(post["event_type"] or "")}</h3>'
+                         f'<p>{html.escape(post["content"] or "")}</p><div class="tiles">')
+            files = []
+            for media in post['media']:
+                original = _href(media['path'], page_dir)
+                files.append(Path(os.path.relpath(media['path'], page_dir)).as_posix())
+                thumb_path = self._thumb_path(media)
+                if is_video_url(media['url']) or not thumb_path.exists():
+                    parts.append(f'<a class="video" href="{original}">&#9654;</a>')
+                else:
+                    parts.append(f'<a href="{original}"><img loading="lazy" decoding="async" '
+                                 f'src="{_href(thumb_path, page_dir)}" alt=""></a>')
+            parts.append('</div></div>')
+            index.append({'id': post['fingerprint'], 'date': post['date'], 'time': post['time'],
+                          'type': post['event_type'], 'files': files})
+        parts.append(f'<nav>{"".join(nav)}</nav></body></html>')
+
+        self._write_text(page_dir / f"{month}.html", ''.join(parts))
+        self._write_text(page_dir / f"{month}.json", json.dumps(index, separators=(',', ':')))
+
+    def _write_front_page(self, ordered, months):
+        rows = []
+        for month in ordered:
+            photos = sum(len(post['media']) for post in months[month])
+            rows.append(f'<li><a href="months/{quote(month)}.html">{html.escape(month)}</a> '
+                        f'&middot; {len(months[month])} posts, {photos} photos</li>')
+        self._write_text(self.root / "index.html",
+                         f'<!DOCTYPE html><html><head><meta charset="utf-8"><title>Nursery photos</title>'
+                         f'<style>{PAGE_STYLE}</style></head><body><h1>Nursery photos</h1>'
+                         f'<ul>{"".join(rows)}</ul></body></html>')
+
+    @staticmethod
+    def _write_text(path, text):
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp_path, path)
@@ -0,0 +1,422 @@
+"""
+Content-addressed image store for Parenta Scraper
+Images are keyed by canonical URL and SHA-256 so re-runs never re-download
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from urllib.parse import urlsplit, urlunsplit
+
+# Shared store lives next to the mode folders so Test and Full share one copy of each photo
+STORE_DIR_NAME = ".parenta_store"
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+
+def canonical_url(url):
+    """
+    Normalise an image URL so the same photo always maps to the same manifest key
+    Drops query strings and fragments (signatures, cache busters) and lowercases the host
+    """
+    parts = urlsplit(url.strip())
+    path = parts.path
+    while '//' in path:
+        path = path.replace('//', '/')
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, '', ''))
+
+
+def default_store_root():
+    """Return the shared store directory in the user's home folder"""
+    return Path.home() / STORE_DIR_NAME
+
+
+class ImageStore:
+    """
+    Content-addressed object store with an on-disk URL manifest
+    Objects are saved once under objects/<aa>/<sha256><ext> and hard-linked into download folders
+    """
+
+    def __init__(self, root=None):
+        self.root = Path(root) if root else default_store_root()
+        self.objects_dir = self.root / "objects"
+        self.tmp_dir = self.root / "tmp"
+        self.manifest_path = self.root / MANIFEST_NAME
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.tmp_dir, exist_ok=True)
+
+        self._lock = threading.RLock()
+        self._url_locks = {}
+        self._dirty = 0
+        self.entries = self._load_manifest()
+        # How many URLs point at each object, so replaced objects can be removed
+        self._object_refs = Counter(entry.get('object') for entry in self.entries.values())
+        for entry in self.entries.values():
+            for derivative in entry.get('derivatives', {}).values():
+                self._object_refs[derivative.get('object')] += 1
+
+    def _load_manifest(self):
+        """Load the URL manifest, starting fresh if it is missing or unreadable"""
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return data.get('entries', {})
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            print(f"Could not read manifest {self.manifest_path}: {e}")
+            return {}
+
+    def save(self):
+        """Write the manifest atomically so a crash never leaves it half-written"""
+        with self._lock:
+            payload = {'version': MANIFEST_VERSION, 'entries': self.entries}
+            tmp_path = self.manifest_path.with_suffix('.json.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(payload, f, indent=1)
+            os.replace(tmp_path, self.manifest_path)
+            self._dirty = 0
+
+    def _mark_dirty(self):
+        """Save every 50 changes so long runs keep their progress if interrupted"""
+        self._dirty += 1
+        if self._dirty >= 50:
+            self.save()
+
+    def object_path(self, entry):
+        """Absolute path of the stored object for a manifest entry"""
+        return self.root / entry['object']
+
+    def lookup(self, url):
+        """Return the manifest entry for a URL if its object is still on disk"""
+        key = canonical_url(url)
+        with self._lock:
+            entry = self.entries.get(key)
+        if entry and self.object_path(entry).exists():
+            return entry
+        return None
+
+    def new_temp_path(self, suffix=".part"):
+        """Return a fresh temp file path inside the store (same filesystem as objects)"""
+        name = f"{os.getpid()}_{threading.get_ident()}_{time.monotonic_ns()}{suffix}"
+        return self.tmp_dir / name
+
+    def url_lock(self, url):
+        """Per-URL lock so two workers never write the same partial file"""
+        key = canonical_url(url)
+        with self._lock:
+            return self._url_locks.setdefault(key, threading.Lock())
+
+    def partial_path(self, url, suffix=".part"):
+        """
+        Deterministic temp file for a URL so an interrupted download can be resumed
+        Lives inside the store so the final rename is atomic on the same filesystem
+        """
+        key = hashlib.sha1(canonical_url(url).encode('utf-8')).hexdigest()
+        return self.tmp_dir / f"{key}{url_extension(url)}{suffix}"
+
+    def add_file(self, url, temp_path, sha256=None, extension=None, extra=None):
+        """
+        Move a fully downloaded temp file into the store and record it in the manifest
+        Identical content already in the store is reused and the temp file discarded
+        """
+        temp_path = Path(temp_path)
+        if sha256 is None:
+            sha256 = hash_file(temp_path)
+        if extension is None:
+            extension = url_extension(url)
+
+        key = canonical_url(url)
+        with self._lock:
+            entry = self.entries.get(key, {})
+            if entry.get('original_sha256') == sha256 and self.object_path(entry).exists():
+                # Same bytes as the original of a post-processed object - keep the processed one
+                temp_path.unlink(missing_ok=True)
+                if extra:
+                    entry.update(extra)
+                self._mark_dirty()
+                return entry
+            for field in ('original_sha256', 'stamped', 'timestamp', 'transcoded', 'near_duplicate_of'):
+                entry.pop(field, None)
+
+            object_rel = self._store_object(temp_path, sha256, extension)
+            object_path = self.root / object_rel
+            self._set_object(entry, object_rel)
+            entry.update({
+                'url': key,
+                'sha256': sha256,
+                'size': object_path.stat().st_size,
+                'object': object_rel,
+                'downloaded_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            })
+            entry.setdefault('paths', [])
+            if extra:
+                entry.update(extra)
+            self.entries[key] = entry
+            self._mark_dirty()
+            return entry
+
+    def _store_object(self, temp_path, sha256, extension):
+        """Move a temp file to its content address (or drop it if already stored)"""
+        object_rel = f"objects/{sha256[:2]}/{sha256}{extension}"
+        object_path = self.root / object_rel
+        if object_path.exists():
+            Path(temp_path).unlink(missing_ok=True)
+        else:
+            os.makedirs(object_path.parent, exist_ok=True)
+            os.replace(temp_path, object_path)
+        return object_rel
+
+    def _set_object(self, entry, object_rel):
+        """Point an entry at a new object, deleting the old one if nothing else uses it"""
+        old_rel = entry.get('object')
+        if old_rel == object_rel:
+            return
+        self._object_refs[object_rel] += 1
+        if old_rel:
+            self._object_refs[old_rel] -= 1
+            if self._object_refs[old_rel] <= 0:
+                del self._object_refs[old_rel]
+                (self.root / old_rel).unlink(missing_ok=True)
+        entry['object'] = object_rel
+
+    def replace_object(self, url, temp_path, extension=None, **fields):
+        """
+        Swap a URL's stored object for a processed version (e.g. with EXIF added, or transcoded)
+        The original hash is kept so revalidation still recognises unchanged server content
+        """
+        sha256 = hash_file(temp_path)
+        with self.url_lock(url):
+            with self._lock:
+                entry = self.entries.get(canonical_url(url))
+                if not entry:
+                    Path(temp_path).unlink(missing_ok=True)
+                    return None
+                entry.setdefault('original_sha256', entry['sha256'])
+                extension = extension or Path(entry['object']).suffix
+                self._set_object(entry, self._store_object(temp_path, sha256, extension))
+                entry['sha256'] = sha256
+                entry['size'] = self.object_path(entry).stat().st_size
+                entry.update(fields)
+                timestamp = entry.get('timestamp')
+                self._mark_dirty()
+            self.relink_all(entry)
+            if timestamp:
+                # A new object starts with a fresh mtime - carry the post time over
+                self.set_timestamp(url, timestamp)
+        return entry
+
+    def share_object(self, url, keeper_url):
+        """
+        Point a near-duplicate URL at another URL's object so both are hard links to one file
+        Returns False if either entry is missing or their file types differ
+        """
+        with self.url_lock(url):
+            with self._lock:
+                entry = self.entries.get(canonical_url(url))
+                keeper = self.entries.get(canonical_url(keeper_url))
+                if not entry or not keeper or entry is keeper:
+                    return False
+                if Path(entry['object']).suffix != Path(keeper['object']).suffix:
+                    return False
+                entry.setdefault('original_sha256', entry['sha256'])
+                self._set_object(entry, keeper['object'])
+                entry['sha256'] = keeper['sha256']
+                entry['size'] = keeper['size']
+                entry['near_duplicate_of'] = keeper['url']
+                self._mark_dirty()
+            self.relink_all(entry)
+        return True
+
+    def set_timestamp(self, url, timestamp):
+        """Set the stored object's modified time (shared by every hard link) to the post time"""
+        with self._lock:
+            entry = self.entries.get(canonical_url(url))
+            if not entry:
+                return
+            entry['timestamp'] = timestamp
+            self._mark_dirty()
+        try:
+            os.utime(self.object_path(entry), (timestamp, timestamp))
+        except OSError:
+            pass
+
+    def forget(self, url):
+        """Remove a URL (e.g. a corrupt download) so the next fetch goes to the network"""
+        with self._lock:
+            entry = self.entries.pop(canonical_url(url), None)
+            if entry and entry.get('object'):
+                object_rel = entry['object']
+                self._object_refs[object_rel] -= 1
+                if self._object_refs[object_rel] <= 0:
+                    del self._object_refs[object_rel]
+                    (self.root / object_rel).unlink(missing_ok=True)
+                self._mark_dirty()
+            return entry
+
+    def link(self, entry, dest_path):
+        """
+        Hard-link a stored object to dest_path, falling back to a copy across filesystems
+        Returns the path actually linked, which has the object's suffix if it was transcoded
+        """
+        dest_path = Path(dest_path)
+        source = self.object_path(entry)
+        if entry.get('transcoded'):
+            # The original was dropped for a transcoded copy - keep the file extension honest
+            dest_path = dest_path.with_suffix(source.suffix)
+        if dest_path.exists():
+            try:
+                if os.path.samefile(source, dest_path):
+                    self._record_path(entry, dest_path)
+                    return dest_path
+            except OSError:
+                pass
+            dest_path.unlink()
+
+        os.makedirs(dest_path.parent, exist_ok=True)
+        try:
+            os.link(source, dest_path)
+        except OSError:
+            # Copy to a sibling temp name first so a crash never leaves a truncated photo
+            tmp_dest = dest_path.with_name(dest_path.name + ".part")
+            shutil.copy2(source, tmp_dest)
+            os.replace(tmp_dest, dest_path)
+        self._record_path(entry, dest_path)
+        return dest_path
+
+    def all_entries(self):
+        """Snapshot of every manifest entry whose object is still on disk"""
+        with self._lock:
+            entries = [dict(entry) for entry in self.entries.values()]
+        return [entry for entry in entries if self.object_path(entry).exists()]
+
+    def touch_verified(self, url):
+        """Record that a conditional request confirmed the stored copy is current"""
+        with self._lock:
+            entry = self.entries.get(canonical_url(url))
+            if entry:
+                entry['verified_at'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+                self._mark_dirty()
+
+    def relink_all(self, entry):
+        """Point every previously linked copy of a URL at the entry's current object"""
+        with self._lock:
+            paths = list(entry.get('paths', []))
+        suffix = self.object_path(entry).suffix
+        for path in paths:
+            path = Path(path)
+            if not path.parent.exists():
+                continue
+            self.link(entry, path)
+            if entry.get('transcoded') and path.suffix != suffix:
+                # Format changed - drop the old-format file and its record
+                path.unlink(missing_ok=True)
+                with self._lock:
+                    if str(path) in entry['paths']:
+                        entry['paths'].remove(str(path))
+
+    def add_derivative(self, url, temp_path, label, extension, **fields):
+        """
+        Store a derived file (e.g. a WebP copy) alongside the original and link it next to
+        every copy of the original (see derivative_path); the mapping is recorded under
+        entry['derivatives'][label]
+        """
+        sha256 = hash_file(temp_path)
+        with self.url_lock(url):
+            with self._lock:
+                entry = self.entries.get(canonical_url(url))
+                if not entry:
+                    Path(temp_path).unlink(missing_ok=True)
+                    return None
+                derivatives = entry.setdefault('derivatives', {})
+                previous = derivatives.get(label, {})
+                derivative = {'object': previous.get('object'), 'paths': []}
+                self._set_object(derivative, self._store_object(temp_path, sha256, extension))
+                derivative.update({
+                    'sha256': sha256,
+                    'size': (self.root / derivative['object']).stat().st_size,
+                    'source_sha256': entry['sha256'],
+                })
+                derivative.update(fields)
+                derivatives[label] = derivative
+                paths = list(entry.get('paths', []))
+                timestamp = entry.get('timestamp')
+                self._mark_dirty()
+            if timestamp:
+                try:
+                    os.utime(self.root / derivative['object'], (timestamp, timestamp))
+                except OSError:
+                    pass
+            for path in paths:
+                path = Path(path)
+                if path.parent.exists():
+                    self.link(derivative, derivative_path(path, extension))
+        return derivative
+
+    def _record_path(self, entry, dest_path):
+        """Remember where an object has been linked so later tools can find it"""
+        with self._lock:
+            paths = entry.setdefault('paths', [])
+            dest = str(dest_path)
+            if dest not in paths:
+                paths.append(dest)
+                self._mark_dirty()
+
+
+def hash_file(path, chunk_size=1024 * 1024):
+    """SHA-256 of a file on disk"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def derivative_path(path, extension):
+    """
+    Where a derived copy of path is linked: the same name with the new extension, or
+    <stem>.small<extension> when that would be the original's own name (e.g. a smaller JPEG)
+    """
+    path = Path(path)
+    same_type = {path.suffix.lower(), extension.lower()} <= {'.jpg', '.jpeg'}
+    if path.suffix.lower() == extension.lower() or same_type:
+        return path.with_name(f"{path.stem}.small{extension}")
+    return path.with_suffix(extension)
+
+
+def url_extension(url, default=".jpg"):
+    """File extension from a URL path, e.g. '.jpg'"""
+    name = urlsplit(url).path.rsplit('/', 1)[-1]
+    if '.' in name:
+        ext = '.' + name.rsplit('.', 1)[-1].lower()
+        if 1 < len(ext) <= 6:
+            return ext
+    return default
+
+
+def post_fingerprint(post_data):
+    """
+    Stable short id for a post built from its content rather than its position in the feed
+    Keeps filenames unchanged when new posts are added at the top
+    """
+    key = '|'.join([
+        post_data.get('date', '') or '',
+        post_data.get('time', '') or '',
+        post_data.get('event_type', '') or '',
+        post_data.get('content', '') or '',
+    ])
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:10]
+
+
+def image_filename(post_data, image_index, url):
+    """Flat filename for one image of a post: date_type_fingerprint_imageindex_originalname"""
+    post_date = (post_data.get('date') or '').replace('/', '-').replace(':', '-')[:20] or "undated"
+    post_type = (post_data.get('event_type') or "unknown").replace('/', '-').replace(':', '-')
+    url_filename = url.split('/')[-1].split('?')[0]
+    if not url_filename or '.' not in url_filename:
+        url_filename = f"image_{image_index}.jpg"
+    return f"{post_date}_{post_type}_{post_fingerprint(post_data)}_{image_index}_{url_filename}"
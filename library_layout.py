@@ -0,0 +1,105 @@
+"""
+Download folder layout for Parenta Scraper
+Shards the library into date or event-type folders and keeps a compact index of which files
+belong to which post, so nothing has to list a 20k-file directory
+"""
+import json
+import os
+import re
+import threading
+from pathlib import Path
+
+from batch_extractor import parse_post_datetime
+from image_store import image_filename, post_fingerprint
+
+INDEX_NAME = "index.json"
+INDEX_SAVE_INTERVAL = 200  # Rewrite the index after this many new images
+
+# Folder layouts offered in the GUI; the value is a function of (post datetime, event type)
+LAYOUTS = {
+    "Flat": None,
+    "Year/Month/Day": lambda taken_at, event_type: (f"{taken_at:%Y}", f"{taken_at:%m}", f"{taken_at:%d}"),
+    "Year/Month": lambda taken_at, event_type: (f"{taken_at:%Y}", f"{taken_at:%m}"),
+    "Event type": lambda taken_at, event_type: (event_type, f"{taken_at:%Y}"),
+}
+DEFAULT_LAYOUT = "Year/Month"
+
+_UNSAFE_CHARS_RE = re.compile(r'[<>:"/\\|?*\x00-\x1f]+')
+
+
+def safe_folder_name(name):
+    """Folder-safe version of free text such as an event type"""
+    return _UNSAFE_CHARS_RE.sub('_', name or '').strip(' ._') or "unknown"
+
+
+def shard_dir(post_data, layout=DEFAULT_LAYOUT):
+    """Relative folder for a post's files under the chosen layout"""
+    shard = LAYOUTS.get(layout)
+    if shard is None:
+        return Path()
+    taken_at = parse_post_datetime(post_data.get('date', ''), post_data.get('time', ''))
+    if taken_at is None:
+        return Path("undated")
+    return Path(*[safe_folder_name(part) for part in shard(taken_at, post_data.get('event_type') or '')])
+
+
+def image_path(download_dir, post_data, image_index, url, layout=DEFAULT_LAYOUT):
+    """Full destination path for one image of a post"""
+    return Path(download_dir) / shard_dir(post_data, layout) / image_filename(post_data, image_index, url)
+
+
+class LibraryIndex:
+    """
+    Compact post -> image paths index stored at the root of a download folder
+    Keyed by post fingerprint; paths are relative to the download folder
+    """
+
+    def __init__(self, download_dir):
+        self.download_dir = Path(download_dir)
+        self.path = self.download_dir / INDEX_NAME
+        self._lock = threading.Lock()
+        self._unsaved = 0
+        self.posts = self._load()
+
+    def _load(self):
+        """Read the existing index, or start empty"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f).get('posts', {})
+        except (OSError, ValueError):
+            return {}
+
+    def add_image(self, post_data, dest_path, fingerprint=None):
+        """Record that dest_path holds one of a post's images"""
+        # Retried failures only keep the post's date and type, so their fingerprint is passed in
+        fingerprint = fingerprint or post_fingerprint(post_data)
+        relative = Path(dest_path).relative_to(self.download_dir).as_posix()
+        with self._lock:
+            post = self.posts.setdefault(fingerprint, {
+                'date': post_data.get('date', ''),
+                'time': post_data.get('time', ''),
+                'event_type': post_data.get('event_type', ''),
+                'files': [],
+            })
+            if relative in post['files']:
+                return
+            post['files'].append(relative)
+            self._unsaved += 1
+            if self._unsaved < INDEX_SAVE_INTERVAL:
+                return
+        self.save()
+
+    def on_downloaded(self, url, dest_path, result, fingerprint, post_data):
+        """Pipeline listener: index every image that is now on disk"""
+        if result != 'failed' and post_data:
+            self.add_image(post_data, dest_path, fingerprint)
+
+    def save(self):
+        """Atomically rewrite the index in compact JSON"""
+        with self._lock:
+            data = json.dumps({'version': 1, 'posts': self.posts}, separators=(',', ':'))
+            self._unsaved = 0
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(data)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,147 @@
+"""
+Alternative folder views for Parenta Scraper
+Builds "By month" and "By activity" trees out of hard links (symlinks where hard links aren't
+possible), so the same photos can be browsed several ways without using any extra disk space
+"""
+import json
+import os
+from pathlib import Path
+
+from batch_extractor import parse_post_datetime
+from library_layout import safe_folder_name
+from post_processing import TRANSCODE_FORMATS
+
+VIEWS_DIR_NAME = "Views"
+VIEWS_STATE_NAME = "views.json"
+
+
+def _month_folder(post):
+    taken_at = parse_post_datetime(post.get('date', ''), post.get('time', ''))
+    return f"{taken_at:%Y-%m}" if taken_at else "undated"
+
+
+def _activity_folder(post):
+    return safe_folder_name(post.get('event_type'))
+
+
+# View name -> function of an index post record returning its folder in that view
+VIEWS = {
+    "By month": _month_folder,
+    "By activity": _activity_folder,
+}
+
+
+def _link(source, dest):
+    """Hard-link source to dest, falling back to a relative symlink"""
+    os.makedirs(dest.parent, exist_ok=True)
+    try:
+        os.link(source, dest)
+    except OSError:
+        os.symlink(os.path.relpath(source, dest.parent), dest)
+
+
+def _current_source(source):
+    """The file as it is on disk now - originals dropped for a transcoded copy change extension"""
+    if source.exists():
+        return source
+    for settings in TRANSCODE_FORMATS.values():
+        candidate = source.with_suffix(settings['extension'])
+        if candidate.exists():
+            return candidate
+    return None
+
+
+def _is_current(source, dest):
+    """True if dest already shows source's current bytes"""
+    try:
+        return os.path.samefile(source, dest)
+    except OSError:
+        return False
+
+
+class LibraryViews:
+    """
+    Keeps the view trees under <download folder>/Views in step with a LibraryIndex
+    The set of links from the last build is kept in views.json, so a rebuild only creates new
+    links, repairs ones whose photo was replaced (e.g. date-stamped) and removes stale ones
+    """
+
+    def __init__(self, library_index, views=VIEWS):
+        self.library_index = library_index
+        self.download_dir = library_index.download_dir
+        self.root = self.download_dir / VIEWS_DIR_NAME
+        self.state_path = self.root / VIEWS_STATE_NAME
+        self.views = views
+
+    def _load_state(self):
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_state(self, links):
+        tmp_path = self.state_path.with_name(self.state_path.name + ".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(links, f, separators=(',', ':'))
+        os.replace(tmp_path, self.state_path)
+
+    def wanted_links(self):
+        """Map of view-relative link path -> download-folder-relative source path"""
+        links = {}
+        for post in self.library_index.posts.values():
+            for view_name, folder_for in self.views.items():
+                folder = Path(view_name) / folder_for(post)
+                for relative in post['files']:
+                    links[(folder / Path(relative).name).as_posix()] = relative
+        return links
+
+    def rebuild(self):
+        """
+        Bring every view up to date with the index without copying any image bytes
+        Returns counts of links created, repaired, unchanged, removed and failed
+        """
+        counts = {'created': 0, 'repaired': 0, 'unchanged': 0, 'removed': 0, 'failed': 0}
+        previous = self._load_state()
+        wanted = self.wanted_links()
+        built = {}
+
+        for link_rel, source_rel in wanted.items():
+            source = _current_source(self.download_dir / source_rel)
+            if source is None:
+                continue  # Not downloaded (yet) - picked up on a later rebuild
+            dest = (self.root / link_rel).with_suffix(source.suffix)
+            link_rel = dest.relative_to(self.root).as_posix()
+            if previous.get(link_rel) == source_rel and _is_current(source, dest):
+                counts['unchanged'] += 1
+            else:
+                replacing = dest.exists() or dest.is_symlink()
+                if replacing:
+                    dest.unlink()
+                try:
+                    _link(source, dest)
+                except OSError:
+                    counts['failed'] += 1  # e.g. FAT drive on Windows: no hard links or symlinks
+                    continue
+                counts['repaired' if replacing else 'created'] += 1
+            built[link_rel] = source_rel
+
+        for link_rel in previous.keys() - built.keys():
+            dest = self.root / link_rel
+            if dest.exists() or dest.is_symlink():
+                dest.unlink()
+                counts['removed'] += 1
+            self._prune_empty(dest.parent)
+
+        os.makedirs(self.root, exist_ok=True)
+        self._save_state(built)
+        return counts
+
+    def _prune_empty(self, folder):
+        """Remove folders emptied by stale links, stopping at the views root"""
+        while folder != self.root and self.root in folder.parents:
+            try:
+                folder.rmdir()
+            except OSError:
+                return  # Not empty
+            folder = folder.parent
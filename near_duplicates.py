@@ -0,0 +1,283 @@
+"""
+Perceptual-hash near-duplicate detection for Parenta Scraper
+Finds the same shot posted more than once (re-posts, resized or re-compressed copies) where the
+bytes differ, so the content-addressed store can't see they are the same photo
+"""
+import concurrent.futures
+import csv
+import json
+import os
+import threading
+from pathlib import Path
+
+from batch_extractor import is_video_url
+
+try:
+    import numpy as np
+except ImportError:  # Excluded from the PyInstaller bundles, which only use pure-Python dHash
+    np = None
+
+HASH_CACHE_NAME = "perceptual_hashes.json"
+HASH_BATCH_SIZE = 256  # Images decoded and hashed together in one NumPy batch
+DECODE_WORKERS = 8  # Pillow releases the GIL while decoding, so threads are enough
+PHASH_SAMPLE_SIZE = 32  # pHash takes the low 8x8 DCT frequencies of a 32x32 thumbnail
+NEAR_DUPLICATE_DISTANCE = 4  # Max differing bits (of 64) for two photos to count as the same shot
+
+
+def _load_thumbnails(path):
+    """Decode one image to the small greyscale samples both hashes need"""
+    from PIL import Image
+
+    with Image.open(path) as image:
+        # JPEG draft mode decodes at 1/2-1/8 scale, which is most of the speed-up
+        image.draft('L', (PHASH_SAMPLE_SIZE * 4, PHASH_SAMPLE_SIZE * 4))
+        grey = image.convert('L')
+        dhash_sample = grey.resize((9, 8), Image.Resampling.BILINEAR)
+        phash_sample = grey.resize((PHASH_SAMPLE_SIZE, PHASH_SAMPLE_SIZE), Image.Resampling.BILINEAR)
+    return dhash_sample, phash_sample
+
+
+def _dct_matrix(size):
+    """Orthonormal DCT-II basis, so a batch DCT is two matrix multiplies"""
+    n = np.arange(size)
+    matrix = np.cos(np.pi * (2 * n[None, :] + 1) * n[:, None] / (2 * size)) * np.sqrt(2 / size)
+    matrix[0] /= np.sqrt(2)
+    return matrix.astype(np.float32)
+
+
+def _pack_bits(bits):
+    """(N, 64) booleans -> list of 64-bit ints"""
+    packed = np.packbits(bits.reshape(len(bits), 64), axis=1)
+    return [int(value) for value in packed.view('>u8').ravel()]
+
+
+def hash_batch(samples):
+    """
+    Compute (dhash, phash) 64-bit ints for a batch of _load_thumbnails results
+    Vectorised over the whole batch with NumPy; without NumPy only dHash is computed
+    """
+    if np is None:
+        hashes = []
+        for dhash_sample, _ in samples:
+            pixels = list(dhash_sample.getdata())
+            value = 0
+            for row in range(8):
+                for col in range(8):
+                    value = (value << 1) | (pixels[row * 9 + col] < pixels[row * 9 + col + 1])
+            hashes.append((value, None))
+        return hashes
+
+    dhash_pixels = np.stack([np.asarray(d, dtype=np.int16) for d, _ in samples])
+    dhashes = _pack_bits(dhash_pixels[:, :, :-1] < dhash_pixels[:, :, 1:])
+
+    phash_pixels = np.stack([np.asarray(p, dtype=np.float32) for _, p in samples])
+    dct = _dct_matrix(PHASH_SAMPLE_SIZE)
+    low = (dct @ phash_pixels @ dct.T)[:, :8, :8].reshape(len(samples), 64)
+    medians = np.median(low[:, 1:], axis=1, keepdims=True)  # DC term would skew the median
+    phashes = _pack_bits(low > medians)
+    return list(zip(dhashes, phashes))
+
+
+class PerceptualHashIndex:
+    """
+    Perceptual hashes for every image in an ImageStore, cached by object SHA-256
+    Only images whose bytes are new since the last run are decoded
+    """
+
+    def __init__(self, image_store):
+        self.image_store = image_store
+        self.cache_path = image_store.root / HASH_CACHE_NAME
+        self._lock = threading.Lock()
+        self.hashes = self._load_cache()
+
+    def _load_cache(self):
+        """Load the sha256 -> {'dhash', 'phash'} cache (hex strings)"""
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save(self):
+        """Atomically write the cache, dropping hashes of objects no longer in the store"""
+        live = {entry['sha256'] for entry in self.image_store.all_entries()}
+        with self._lock:
+            data = {sha: value for sha, value in self.hashes.items() if sha in live}
+        tmp_path = self.cache_path.with_name(self.cache_path.name + ".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.cache_path)
+
+    def update(self, workers=DECODE_WORKERS, progress_callback=None):
+        """
+        Hash every image not yet in the cache, HASH_BATCH_SIZE at a time
+        Images hashed without NumPy (dHash only) are hashed again once it is available
+        Returns the number of images newly hashed
+        """
+        # Several URLs can share one object - hash each object once
+        pending = {}
+        for entry in self.image_store.all_entries():
+            cached = self.hashes.get(entry['sha256'])
+            if is_video_url(entry['url']) or (cached and (np is None or cached.get('phash'))):
+                continue
+            pending.setdefault(entry['sha256'], self.image_store.object_path(entry))
+        pending = list(pending.items())
+
+        done = 0
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            for start in range(0, len(pending), HASH_BATCH_SIZE):
+                batch = pending[start:start + HASH_BATCH_SIZE]
+                loaded = []
+                for (sha256, _), result in zip(batch, executor.map(self._try_load, [path for _, path in batch])):
+                    if result is not None:
+                        loaded.append((sha256, result))
+                if loaded:
+                    hashes = hash_batch([samples for _, samples in loaded])
+                    with self._lock:
+                        for (sha256, _), (dhash, phash) in zip(loaded, hashes):
+                            self.hashes[sha256] = {
+                                'dhash': f"{dhash:016x}",
+                                'phash': f"{phash:016x}" if phash is not None else None,
+                            }
+                done += len(batch)
+                if progress_callback:
+                    progress_callback(done, len(pending))
+        self.save()
+        return len(pending)
+
+    @staticmethod
+    def _try_load(path):
+        try:
+            return _load_thumbnails(path)
+        except Exception:
+            return None  # Unreadable files are reported by post-processing, not here
+
+    def find_groups(self, max_distance=NEAR_DUPLICATE_DISTANCE):
+        """
+        Group store entries whose perceptual hashes are within max_distance bits
+        Returns a list of groups, each a list of entries (largest file first); every entry is
+        within max_distance of the first, since chains of close pairs can drift much further
+        """
+        kind = 'phash' if np is not None else 'dhash'
+        by_sha = {}
+        for entry in self.image_store.all_entries():
+            cached = self.hashes.get(entry['sha256'])
+            if cached and cached.get(kind):
+                by_sha.setdefault(entry['sha256'], []).append(entry)
+        shas = list(by_sha)
+        values = [int(self.hashes[sha][kind], 16) for sha in shas]
+
+        parent = list(range(len(shas)))
+
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        for i, j in candidate_pairs(values, max_distance):
+            root_i, root_j = find(i), find(j)
+            if root_i != root_j:
+                parent[root_j] = root_i
+
+        clusters = {}
+        for i, sha in enumerate(shas):
+            clusters.setdefault(find(i), []).append(sha)
+
+        groups = []
+        for members in clusters.values():
+            if len(members) < 2:
+                continue
+            entries = [entry for sha in members for entry in by_sha[sha]]
+            entries.sort(key=lambda entry: entry.get('size', 0), reverse=True)
+            keeper = int(self.hashes[entries[0]['sha256']][kind], 16)
+            entries = [entry for entry in entries
+                       if (int(self.hashes[entry['sha256']][kind], 16) ^ keeper).bit_count() <= max_distance]
+            if len(entries) > 1:
+                groups.append(entries)
+        groups.sort(key=len, reverse=True)
+        return groups
+
+
+def _popcount(values):
+    """Bits set in each element of a uint64 array"""
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(values)
+    return np.unpackbits(values.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+
+def _band_buckets(values, array, shift, mask):
+    """Lists of indices whose hashes share the same bits in one band (buckets of 2+ only)"""
+    if array is None:
+        buckets = {}
+        for index, value in enumerate(values):
+            buckets.setdefault((value >> shift) & mask, []).append(index)
+        return [members for members in buckets.values() if len(members) > 1]
+
+    keys = (array >> np.uint64(shift)) & np.uint64(mask)
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+    sizes = np.diff(np.r_[starts, len(order)])
+    return [order[start:start + size].tolist() for start, size in zip(starts[sizes > 1], sizes[sizes > 1])]
+
+
+def candidate_pairs(values, max_distance):
+    """
+    Yield index pairs of 64-bit hashes within max_distance bits of each other
+    Splits each hash into max_distance + 1 bands: two hashes that close must agree exactly on at
+    least one band (pigeonhole), so only hashes sharing a band bucket are compared - near-linear
+    instead of all-pairs over tens of thousands of images
+    """
+    bands = max_distance + 1
+    widths = [64 // bands + (1 if band < 64 % bands else 0) for band in range(bands)]
+    array = np.array(values, dtype=np.uint64) if np is not None else None
+    seen = set()
+    shift = 0
+    for width in widths:
+        for members in _band_buckets(values, array, shift, (1 << width) - 1):
+            if array is not None and len(members) > 32:
+                # Big bucket (e.g. many plain-colour frames) - compare all of it in one go
+                indices = np.array(members)
+                distances = _popcount(array[indices][:, None] ^ array[indices][None, :])
+                close = np.argwhere(np.triu(distances <= max_distance, k=1))
+                pairs = [(members[a], members[b]) for a, b in close]
+            else:
+                pairs = [(a, b) for pos, a in enumerate(members) for b in members[pos + 1:]
+                         if (values[a] ^ values[b]).bit_count() <= max_distance]
+            for pair in pairs:
+                if pair not in seen:
+                    seen.add(pair)
+                    yield pair
+        shift += width
+
+
+def write_report(groups, report_path):
+    """Write one CSV row per near-duplicate, next to the photo it duplicates"""
+    with open(report_path, 'w', newline='', encoding='utf-8') as csvfile:
+        csv_writer = csv.writer(csvfile)
+        csv_writer.writerow(['Group', 'Keep', 'File', 'Size', 'URL'])
+        for number, entries in enumerate(groups, start=1):
+            for position, entry in enumerate(entries):
+                paths = entry.get('paths') or [str(entry['object'])]
+                csv_writer.writerow([number, 'yes' if position == 0 else 'no', Path(paths[0]).name,
+                                     entry.get('size', 0), entry['url']])
+
+
+def link_duplicates(image_store, groups):
+    """
+    Replace every near-duplicate with a hard link to the largest copy in its group
+    Returns the number of bytes freed
+    """
+    freed = 0
+    for entries in groups:
+        keeper = entries[0]
+        released = set()
+        for entry in entries[1:]:
+            if entry['sha256'] == keeper['sha256']:
+                continue
+            if image_store.share_object(entry['url'], keeper['url']) and entry['sha256'] not in released:
+                released.add(entry['sha256'])
+                freed += entry.get('size', 0)
+    image_store.save()
+    return freed
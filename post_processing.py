@@ -0,0 +1,455 @@
+"""
+Post-download processing for Parenta Scraper
+Verifies downloaded photos decode, stamps the post's date and event type into EXIF/XMP and
+optionally transcodes them to save space, using a process pool so it keeps every core busy
+while downloads continue
+"""
+import collections
+import concurrent.futures
+import io
+import os
+import threading
+import time
+
+from batch_extractor import parse_post_datetime, is_video_url
+
+# Leave one core for the GUI, the browser and the download threads
+POST_PROCESS_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+
+# A corrupt image is re-downloaded this many times before it goes to the failure log
+MAX_CORRUPT_REDOWNLOADS = 1
+
+# Opt-in space-saving formats: Pillow format name, file extension and default quality
+TRANSCODE_FORMATS = {
+    'webp': {'format': 'WEBP', 'extension': '.webp', 'quality': 80},
+    'avif': {'format': 'AVIF', 'extension': '.avif', 'quality': 60},
+    'jpeg': {'format': 'JPEG', 'extension': '.jpg', 'quality': 82},
+}
+
+EXIF_DATETIME = 0x0132
+EXIF_IMAGE_DESCRIPTION = 0x010E
+EXIF_SOFTWARE = 0x0131
+EXIF_IFD_POINTER = 0x8769
+EXIF_DATETIME_ORIGINAL = 0x9003
+EXIF_DATETIME_DIGITIZED = 0x9004
+
+XMP_HEADER = b"http://ns.adobe.com/xap/1.0/\x00"
+XMP_TEMPLATE = """<?xpacket begin="\ufeff" id="W5M0MpCehiHzreSzNTczkc9d"?>
+<x:xmpmeta xmlns:x="adobe:ns:meta/">
+ <rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">
+  <rdf:Description rdf:about=""
+    xmlns:xmp="http://ns.adobe.com/xap/1.0/"
+    xmlns:photoshop="http://ns.adobe.com/photoshop/1.0/"
+    xmlns:dc="http://purl.org/dc/elements/1.1/">
+   <photoshop:DateCreated>{iso_date}</photoshop:DateCreated>
+   <xmp:CreateDate>{iso_date}</xmp:CreateDate>
+   <dc:subject><rdf:Bag><rdf:li>{event_type}</rdf:li></rdf:Bag></dc:subject>
+   <dc:description><rdf:Alt><rdf:li xml:lang="x-default">{event_type}</rdf:li></rdf:Alt></dc:description>
+  </rdf:Description>
+ </rdf:RDF>
+</x:xmpmeta>
+<?xpacket end="w"?>"""
+
+
+def _xml_escape(text):
+    """Escape text for the XMP packet"""
+    return (text.replace('&', '&amp;').replace('<', '&lt;')
+            .replace('>', '&gt;').replace('"', '&quot;'))
+
+
+def verify_image(path):
+    """Raise if the file isn't a complete, decodable image"""
+    from PIL import Image
+
+    with Image.open(path) as image:
+        image.verify()
+    # verify() only checks structure - load() decodes every pixel and catches truncation
+    with Image.open(path) as image:
+        image.load()
+
+
+def _jpeg_segments(data):
+    """Split a JPEG into (marker, segment_bytes) up to the start of scan, plus the remainder"""
+    if data[:2] != b'\xff\xd8':
+        raise ValueError("not a JPEG")
+    segments = []
+    pos = 2
+    while pos + 4 <= len(data):
+        if data[pos] != 0xFF:
+            raise ValueError("corrupt JPEG marker")
+        marker = data[pos + 1]
+        if marker == 0xDA:  # Start of scan - the rest is image data
+            break
+        length = int.from_bytes(data[pos + 2:pos + 4], 'big')
+        segments.append((marker, data[pos:pos + 2 + length]))
+        pos += 2 + length
+    return segments, data[pos:]
+
+
+def stamp_jpeg(data, exif_bytes, xmp_bytes):
+    """
+    Losslessly replace the EXIF and XMP APP1 segments of a JPEG
+    The compressed image data is copied unchanged - nothing is re-encoded
+    """
+    segments, rest = _jpeg_segments(data)
+    kept = []
+    for marker, segment in segments:
+        payload = segment[4:]
+        if marker == 0xE1 and (payload.startswith(b'Exif\x00\x00') or payload.startswith(XMP_HEADER)):
+            continue
+        kept.append((marker, segment))
+
+    def app1(payload):
+        return b'\xff\xe1' + (len(payload) + 2).to_bytes(2, 'big') + payload
+
+    new_segments = [app1(exif_bytes)]
+    if len(XMP_HEADER) + len(xmp_bytes) + 2 <= 0xFFFF:
+        new_segments.append(app1(XMP_HEADER + xmp_bytes))
+
+    # Keep a JFIF APP0 first, as readers expect
+    head = [segment for marker, segment in kept if marker == 0xE0][:1]
+    tail = [segment for marker, segment in kept if not (marker == 0xE0 and segment in head)]
+    return b'\xff\xd8' + b''.join(head + new_segments + tail) + rest
+
+
+def build_exif(existing_exif, taken_at, event_type):
+    """EXIF block with capture date and description, keeping the camera's other tags"""
+    from PIL import Image
+
+    exif = Image.Exif()
+    if existing_exif:
+        exif.load(existing_exif)
+    stamp = taken_at.strftime('%Y:%m:%d %H:%M:%S')
+    exif[EXIF_DATETIME] = stamp
+    if event_type:
+        exif[EXIF_IMAGE_DESCRIPTION] = event_type
+    exif[EXIF_SOFTWARE] = "Parenta Scraper"
+    exif_ifd = exif.get_ifd(EXIF_IFD_POINTER)
+    exif_ifd[EXIF_DATETIME_ORIGINAL] = stamp
+    exif_ifd[EXIF_DATETIME_DIGITIZED] = stamp
+    return exif.tobytes()
+
+
+def transcode_image(source_path, output_path, settings):
+    """
+    Re-encode an image in a smaller format, keeping its EXIF
+    Returns the output size, or None if the result wasn't smaller than the source
+    """
+    from PIL import Image
+
+    with Image.open(source_path) as image:
+        exif = image.info.get('exif')
+        options = {'quality': settings['quality']}
+        if exif:
+            options['exif'] = exif
+        if settings['format'] == 'JPEG':
+            options.update(optimize=True, progressive=True)
+            image = image.convert('RGB')
+        elif settings['format'] == 'WEBP':
+            options['method'] = 4
+        image.save(output_path, settings['format'], **options)
+
+    output_size = os.path.getsize(output_path)
+    if output_size >= os.path.getsize(source_path):
+        os.unlink(output_path)
+        return None
+    return output_size
+
+
+def process_image(path, temp_path, date_text, time_text, event_type, transcode=None, transcode_path=None):
+    """
+    Process-pool task: verify one downloaded image and write a stamped copy to temp_path
+    With transcode settings, also writes a re-encoded copy of the (stamped) image to transcode_path
+    Returns a dict with 'status' of 'corrupt', 'verified' (nothing to stamp) or 'stamped'
+    """
+    try:
+        verify_image(path)
+    except Exception as e:
+        return {'status': 'corrupt', 'error': str(e)[:200]}
+
+    taken_at = parse_post_datetime(date_text, time_text)
+    result = {'status': 'verified', 'timestamp': taken_at.timestamp() if taken_at else None}
+    if taken_at is not None:
+        _stamp(path, temp_path, taken_at, event_type, result)
+
+    if transcode:
+        source = result.get('temp_path', path)
+        try:
+            started = time.perf_counter()
+            output_size = transcode_image(source, transcode_path, transcode)
+            result['transcode'] = {
+                'temp_path': transcode_path if output_size else None,
+                'source_size': os.path.getsize(source),
+                'size': output_size,
+                'seconds': time.perf_counter() - started,
+            }
+        except Exception as e:
+            result['transcode_error'] = str(e)[:200]
+    return result
+
+
+def _stamp(path, temp_path, taken_at, event_type, result):
+    """Write a date-stamped copy of a JPEG to temp_path, updating result in place"""
+    from PIL import Image
+
+    try:
+        with Image.open(path) as image:
+            image_format = image.format
+            existing_exif = image.info.get('exif')
+        if image_format != 'JPEG':
+            return
+
+        with open(path, 'rb') as f:
+            data = f.read()
+        xmp = XMP_TEMPLATE.format(
+            iso_date=taken_at.strftime('%Y-%m-%dT%H:%M:%S'),
+            event_type=_xml_escape(event_type or ''),
+        ).encode('utf-8')
+        stamped = stamp_jpeg(data, build_exif(existing_exif, taken_at, event_type), xmp)
+
+        # Make sure we didn't damage anything before handing it back
+        with Image.open(io.BytesIO(stamped)) as check:
+            check.load()
+        with open(temp_path, 'wb') as f:
+            f.write(stamped)
+        result['status'] = 'stamped'
+        result['temp_path'] = temp_path
+    except Exception as e:
+        # Stamping is best effort - the verified original is still good
+        result['error'] = str(e)[:200]
+
+
+class PostProcessor:
+    """
+    Runs process_image for each freshly downloaded image in a process pool
+    Stamped copies replace the stored object; corrupt files are queued to download again, and
+    handed back to the pipeline by submit_redownloads() (or drain()) on the thread that owns it
+    transcode is a TRANSCODE_FORMATS key (or None); keep_originals=False replaces the original
+    with the transcoded copy instead of storing both
+    Listeners see every pipeline result once the file on disk is final (after processing, if any)
+    """
+
+    def __init__(self, image_store, pipeline, workers=POST_PROCESS_WORKERS, log=print,
+                 transcode=None, quality=None, keep_originals=True):
+        self.image_store = image_store
+        self.pipeline = pipeline
+        self.log = log
+        self.transcode = None
+        if transcode:
+            self.transcode = dict(TRANSCODE_FORMATS[transcode])
+            if quality:
+                self.transcode['quality'] = quality
+            self.transcode_label = f"{transcode}-q{self.transcode['quality']}"
+        self.keep_originals = keep_originals
+        self.transcode_stats = {'count': 0, 'skipped': 0, 'source_bytes': 0, 'output_bytes': 0, 'seconds': 0.0}
+        self.executor = concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+        self.counts = {'stamped': 0, 'verified': 0, 'corrupt': 0}
+        self.failed = 0  # Corrupt downloads given up on
+        self._pending = set()
+        self._redownloads = {}
+        self._resubmit = []  # Corrupt downloads waiting to go back to the pipeline
+        self._corrupt_results = collections.Counter()  # Pipeline result of each corrupt copy
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._listeners = []
+        pipeline.add_listener(self.on_downloaded)
+
+    def add_listener(self, callback):
+        """
+        Register callback(url, dest_path, result, fingerprint, post_data), called like a pipeline
+        listener but only after post-processing has finished with the file
+        """
+        self._listeners.append(callback)
+
+    def _emit(self, url, dest_path, result, fingerprint, post_data):
+        for listener in self._listeners:
+            try:
+                listener(url, dest_path, result, fingerprint, post_data)
+            except Exception as e:
+                self.log(f"Post-processing listener failed: {str(e)[:80]}")
+
+    def on_downloaded(self, url, dest_path, result, fingerprint, post_data):
+        """Pipeline listener: queue new or changed images for processing"""
+        if result not in ('downloaded', 'updated') or is_video_url(url):
+            self._emit(url, dest_path, result, fingerprint, post_data)
+            return
+        entry = self.image_store.lookup(url)
+        if not entry or entry.get('stamped'):
+            self._emit(url, dest_path, result, fingerprint, post_data)
+            return
+        post_data = post_data or {}
+        try:
+            future = self.executor.submit(
+                process_image,
+                str(self.image_store.object_path(entry)),
+                str(self.image_store.new_temp_path(".stamped")),
+                post_data.get('date', ''),
+                post_data.get('time', ''),
+                post_data.get('event_type', ''),
+                self.transcode,
+                str(self.image_store.new_temp_path(".transcoded")) if self.transcode else None,
+            )
+        except RuntimeError:
+            # Pool already shut down - pass the file on unprocessed rather than lose track of it
+            self._emit(url, dest_path, result, fingerprint, post_data)
+            return
+        with self._lock:
+            self._pending.add(future)
+        future.add_done_callback(
+            lambda done: self._finished(done, url, dest_path, result, fingerprint, post_data))
+
+    def _finished(self, future, url, dest_path, result, fingerprint, post_data):
+        """Apply a finished task's result back in this process"""
+        final_path = dest_path
+        try:
+            outcome = future.result()
+            status = outcome['status']
+            if status == 'corrupt':
+                with self._lock:
+                    self._corrupt_results[result] += 1
+                if not self._handle_corrupt(url, dest_path, fingerprint, post_data, outcome.get('error', '')):
+                    result = 'failed'
+                else:
+                    result = None  # The re-download reports it again
+            elif status == 'stamped':
+                self.image_store.replace_object(url, outcome['temp_path'], stamped=True,
+                                                timestamp=outcome.get('timestamp'))
+            elif outcome.get('timestamp'):
+                self.image_store.set_timestamp(url, outcome['timestamp'])
+            if outcome.get('transcode') and self._apply_transcode(url, outcome['transcode']):
+                final_path = dest_path.with_suffix(self.transcode['extension'])
+            elif outcome.get('transcode_error'):
+                self.log(f"Transcode failed for {dest_path.name}: {outcome['transcode_error'][:80]}")
+            with self._lock:
+                self.counts[status] += 1
+        except Exception as e:
+            self.log(f"Post-processing failed for {dest_path.name}: {str(e)[:80]}")
+        finally:
+            if result:
+                self._emit(url, final_path, result, fingerprint, post_data)
+            with self._lock:
+                self._pending.discard(future)
+                self._idle.notify_all()
+
+    def _apply_transcode(self, url, info):
+        """
+        Record a transcoded copy in the store, either beside or instead of the original
+        Returns True if the original was replaced (so its files changed extension)
+        """
+        with self._lock:
+            stats = self.transcode_stats
+            stats['seconds'] += info['seconds']
+            if not info['temp_path']:
+                stats['skipped'] += 1  # Already smaller than the transcoded version would be
+                return False
+            stats['count'] += 1
+            stats['source_bytes'] += info['source_size']
+            stats['output_bytes'] += info['size']
+
+        fields = {'format': self.transcode['format'], 'quality': self.transcode['quality'],
+                  'source_size': info['source_size']}
+        if self.keep_originals:
+            self.image_store.add_derivative(url, info['temp_path'], self.transcode_label,
+                                            self.transcode['extension'], **fields)
+            return False
+        else:
+            entry = self.image_store.lookup(url)
+            fields['source_sha256'] = entry['sha256'] if entry else None
+            fields['label'] = self.transcode_label
+            self.image_store.replace_object(url, info['temp_path'], extension=self.transcode['extension'],
+                                            transcoded=fields)
+            return True
+
+    def transcode_report(self):
+        """One-line summary of bytes saved and time per image, or None if transcoding is off"""
+        if not self.transcode:
+            return None
+        stats = self.transcode_stats
+        processed = stats['count'] + stats['skipped']
+        if not processed:
+            return f"Transcode ({self.transcode_label}): no new images"
+        saved = stats['source_bytes'] - stats['output_bytes']
+        percent = saved * 100 / stats['source_bytes'] if stats['source_bytes'] else 0
+        return (f"Transcode ({self.transcode_label}): {stats['count']} images, "
+                f"{stats['source_bytes'] / 1048576:.1f} MB -> {stats['output_bytes'] / 1048576:.1f} MB "
+                f"(saved {saved / 1048576:.1f} MB, {percent:.0f}%), "
+                f"{stats['seconds'] * 1000 / processed:.0f} ms/image, {stats['skipped']} kept as-is")
+
+    def _handle_corrupt(self, url, dest_path, fingerprint, post_data, error):
+        """
+        Drop the bad copy from the store and download it again (a limited number of times)
+        Returns False once it has given up and logged the failure
+        """
+        entry = self.image_store.forget(url)
+        # Never leave a broken photo in the download folders
+        for path in (entry or {}).get('paths', []):
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+        with self._lock:
+            attempts = self._redownloads.get(url, 0)
+            self._redownloads[url] = attempts + 1
+        if attempts < MAX_CORRUPT_REDOWNLOADS:
+            self.log(f"⚠ {dest_path.name} is corrupt ({error[:50]}) - downloading again")
+            # This runs on a pool callback thread, where a blocking submit could stall the pool
+            with self._lock:
+                self._resubmit.append((url, dest_path, fingerprint, post_data))
+            return True
+        self.log(f"❌ {dest_path.name} is still corrupt after re-downloading")
+        self.pipeline.failure_log.record(url, dest_path, fingerprint, f"corrupt image: {error}", 1, post_data)
+        with self._lock:
+            self.failed += 1
+        return False
+
+    def merge_counts(self, counts):
+        """
+        Pipeline counts corrected for corrupt downloads: each corrupt copy the pipeline counted
+        as downloaded (or updated) is taken back out, and those given up on count as failed
+        """
+        counts = dict(counts)
+        with self._lock:
+            for result, number in self._corrupt_results.items():
+                counts[result] -= number
+            counts['failed'] += self.failed
+        return counts
+
+    def wait(self):
+        """Block until every submitted image has been processed"""
+        with self._idle:
+            while self._pending:
+                self._idle.wait()
+
+    def drain(self):
+        """
+        Wait until downloads and processing have both settled, including re-downloads
+        Call from the thread that submits to the pipeline - queued re-downloads are submitted here
+        """
+        while True:
+            self.pipeline.join()
+            self.wait()
+            resubmitted = self.submit_redownloads()
+            if not resubmitted and not self.pipeline.queue.unfinished_tasks:
+                return
+
+    def submit_redownloads(self):
+        """
+        Hand queued corrupt-image re-downloads to the pipeline; call from the thread that submits
+        to it (e.g. between scroll rounds) so they download during the run. Returns how many
+        """
+        with self._lock:
+            resubmit, self._resubmit = self._resubmit, []
+        for url, dest_path, fingerprint, post_data in resubmit:
+            self.pipeline.submit(url, dest_path, fingerprint, post_data)
+        return len(resubmit)
+
+    def close(self):
+        """Wait for outstanding work and shut the pool down; undrained re-downloads are logged as failures"""
+        self.wait()
+        with self._lock:
+            abandoned, self._resubmit = self._resubmit, []
+            self.failed += len(abandoned)
+        for url, dest_path, fingerprint, post_data in abandoned:
+            self.pipeline.failure_log.record(url, dest_path, fingerprint, "corrupt image (not downloaded again)", 1, post_data)
+        self.executor.shutdown()
+        return dict(self.counts)
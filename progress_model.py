@@ -0,0 +1,156 @@
+"""
+Progress tracking for Parenta Scraper
+Counts what each phase has done (scroll, extract, download), estimates the totals while they
+are still unknown, and turns that into one fraction, rates and an ETA for the GUI
+"""
+import threading
+import time
+from datetime import datetime
+
+from batch_extractor import parse_post_datetime
+
+# Share of the progress bar given to loading/extracting posts; downloads get the rest
+DISCOVERY_WEIGHT = 0.4
+RATE_WINDOW_SECONDS = 30  # Rates are measured over roughly this much recent history
+
+
+def expected_history_start(conn):
+    """Oldest post date from a previous run's catalog, or None - tells us how far back to expect to scroll"""
+    if conn is None:
+        return None
+    row = conn.execute("SELECT MIN(taken_at) FROM posts WHERE taken_at IS NOT NULL").fetchone()
+    if not row or not row[0]:
+        return None
+    return datetime.fromisoformat(row[0])
+
+
+class ProgressModel:
+    """
+    Thread-safe counters updated by the scraper; snapshot() is polled by the GUI on a timer
+    Downloads are read straight from the pipeline so workers don't report twice
+    """
+
+    def __init__(self, max_scroll_rounds=None, history_start=None):
+        self.max_scroll_rounds = max_scroll_rounds
+        self.history_start = history_start
+        self.pipeline = None
+        self.phase = "Starting"
+        self.scroll_rounds = 0
+        self.posts_discovered = 0
+        self.posts_extracted = 0
+        self.newest_post = None
+        self.oldest_post = None
+        self.discovery_done = False
+        self.finished = False
+        self.started_at = time.monotonic()
+        self._samples = []  # (time, fraction, images done, bytes) for rates
+        self._lock = threading.Lock()
+
+    def set_phase(self, phase):
+        with self._lock:
+            self.phase = phase
+
+    def scrolled(self, posts_discovered):
+        """One scroll round finished with this many posts on the page"""
+        with self._lock:
+            self.scroll_rounds += 1
+            self.posts_discovered = max(self.posts_discovered, posts_discovered)
+
+    def extracted(self, posts_data):
+        """A batch of posts was extracted and queued"""
+        with self._lock:
+            for post_data in posts_data:
+                if not post_data:
+                    continue
+                self.posts_extracted += 1
+                taken_at = parse_post_datetime(post_data.get('date', ''), post_data.get('time', ''))
+                if taken_at:
+                    self.newest_post = max(self.newest_post or taken_at, taken_at)
+                    self.oldest_post = min(self.oldest_post or taken_at, taken_at)
+            self.posts_discovered = max(self.posts_discovered, self.posts_extracted)
+
+    def discovery_finished(self):
+        """No more posts to find - the totals are now known"""
+        with self._lock:
+            self.discovery_done = True
+            self.posts_discovered = self.posts_extracted
+
+    def finish(self):
+        with self._lock:
+            self.discovery_done = True
+            self.posts_discovered = self.posts_extracted
+            self.finished = True
+            self.phase = "Complete"
+
+    def _discovery_fraction(self):
+        """How much of the feed has been loaded, from the oldest date reached or the scroll budget"""
+        if self.discovery_done:
+            return 1.0
+        if self.history_start and self.newest_post and self.oldest_post and self.newest_post > self.history_start:
+            covered = (self.newest_post - self.oldest_post).total_seconds()
+            span = (self.newest_post - self.history_start).total_seconds()
+            return min(0.99, max(0.0, covered / span))
+        if self.max_scroll_rounds:
+            return min(0.99, self.scroll_rounds / self.max_scroll_rounds)
+        return 0.0
+
+    def snapshot(self):
+        """Current fraction, counts, estimated totals, rates and ETA as a dict"""
+        with self._lock:
+            pipeline = self.pipeline
+            images_queued = pipeline.submitted if pipeline else 0
+            images_done = pipeline.completed if pipeline else 0
+            bytes_done = pipeline.bytes_downloaded if pipeline else 0
+            discovery = self._discovery_fraction()
+
+            # Totals: extrapolate what has been seen so far by how much of the feed is loaded
+            posts_total = self.posts_discovered
+            if not self.discovery_done and discovery > 0:
+                posts_total = max(posts_total, round(self.posts_extracted / discovery))
+            images_total = images_queued
+            if self.posts_extracted and not self.discovery_done:
+                images_total = max(images_queued, round(images_queued / self.posts_extracted * posts_total))
+
+            download = images_done / images_total if images_total else (1.0 if self.discovery_done else 0.0)
+            fraction = 1.0 if self.finished else min(0.99, DISCOVERY_WEIGHT * discovery + (1 - DISCOVERY_WEIGHT) * download)
+
+            now = time.monotonic()
+            self._samples.append((now, fraction, images_done, bytes_done))
+            while len(self._samples) > 2 and now - self._samples[0][0] > RATE_WINDOW_SECONDS:
+                self._samples.pop(0)
+            first = self._samples[0]
+            window = now - first[0]
+            images_rate = (images_done - first[2]) / window if window > 0 else 0.0
+            bytes_rate = (bytes_done - first[3]) / window if window > 0 else 0.0
+            fraction_rate = (fraction - first[1]) / window if window > 0 else 0.0
+            eta = (1.0 - fraction) / fraction_rate if fraction_rate > 0 and not self.finished else None
+
+            return {
+                'phase': self.phase,
+                'fraction': fraction,
+                'posts_extracted': self.posts_extracted,
+                'posts_total': posts_total,
+                'posts_estimated': not self.discovery_done,
+                'images_done': images_done,
+                'images_total': images_total,
+                'bytes_done': bytes_done,
+                'images_per_second': images_rate,
+                'bytes_per_second': bytes_rate,
+                'eta_seconds': eta,
+                'elapsed_seconds': now - self.started_at,
+            }
+
+
+def format_progress(snapshot):
+    """One status line for the GUI, e.g. 'Downloading · posts 340/~900 · images 1200/~3100 · 2.1 MB/s · ETA 6m'"""
+    approx = "~" if snapshot['posts_estimated'] else ""
+    parts = [
+        snapshot['phase'],
+        f"posts {snapshot['posts_extracted']}/{approx}{snapshot['posts_total']}",
+        f"images {snapshot['images_done']}/{approx}{snapshot['images_total']}",
+        f"{snapshot['images_per_second']:.1f} img/s, {snapshot['bytes_per_second'] / 1048576:.1f} MB/s",
+    ]
+    eta = snapshot['eta_seconds']
+    if eta is not None:
+        parts.append(f"ETA {eta / 60:.0f}m" if eta >= 90 else f"ETA {eta:.0f}s")
+    return " · ".join(parts)
@@ -0,0 +1,61 @@
+"""
+Pause / resume / cancel for Parenta Scraper runs
+One RunControl is shared by the scraper thread and the download workers; each checks it at safe
+points (between scroll rounds, posts and downloads) so a run stops cleanly instead of being killed
+"""
+import threading
+
+
+class ScrapeCancelled(BaseException):
+    """
+    Raised at a checkpoint once the user has cancelled the run
+    A BaseException (like KeyboardInterrupt) so the scraper's many "except Exception" fallbacks
+    don't swallow it and carry on
+    """
+
+
+class RunControl:
+    """Thread-safe pause and cancel flags; the GUI sets them, workers check them"""
+
+    def __init__(self):
+        self._cancelled = threading.Event()
+        self._running = threading.Event()  # Cleared while paused
+        self._running.set()
+
+    @property
+    def paused(self):
+        return not self._running.is_set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def pause(self):
+        if not self.cancelled:
+            self._running.clear()
+
+    def resume(self):
+        self._running.set()
+
+    def cancel(self):
+        self._cancelled.set()
+        self._running.set()  # Wake anything paused so it can see the cancel and wind down
+
+    def wait_while_paused(self):
+        """Block while paused (returns straight away once cancelled)"""
+        self._running.wait()
+
+    def wait(self, seconds):
+        """Sleep up to seconds; returns True early if the run is cancelled"""
+        return self._cancelled.wait(seconds)
+
+    def checkpoint(self):
+        """Safe stopping point: waits out a pause, then raises ScrapeCancelled if cancelled"""
+        self.wait_while_paused()
+        if self.cancelled:
+            raise ScrapeCancelled()
+
+    def sleep(self, seconds):
+        """time.sleep for the scraper thread that stops early with ScrapeCancelled"""
+        if self.wait(seconds):
+            raise ScrapeCancelled()
@@ -4,27 +4,40 @@ Simple Parenta Scraper with tkinter GUI
 Works on Windows, macOS, and Linux (including WSL2)
 """
 
+import startup_report
+startup_report.install()  # Times the imports below when a startup report was asked for
+
 import customtkinter as ctk
 import threading
+import multiprocessing
+import queue
+import logging
+from logging.handlers import RotatingFileHandler
+import importlib
 import time
 import os
 import platform
-import requests
-import csv
+import sys
 from pathlib import Path
-from PIL import Image
-import io
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.service import Service as ChromeService
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.support.ui import WebDriverWait
-from webdriver_manager.chrome import ChromeDriverManager
-from batch_extractor import extract_all_posts_javascript, extract_all_posts_with_carousel_images_js
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import WebDriverException, TimeoutException
-from selenium.webdriver.common.action_chains import ActionChains
-from selenium.webdriver.common.keys import Keys
+from batch_extractor import extract_all_posts_javascript, extract_all_posts_with_carousel_images_js, is_video_url
+from image_store import ImageStore, post_fingerprint, default_store_root
+from post_processing import PostProcessor
+from library_layout import LAYOUTS, DEFAULT_LAYOUT, LibraryIndex, image_path
+from library_views import LibraryViews
+from archive_export import ARCHIVE_FORMATS, ArchiveSink
+from catalog import Catalog, open_catalog, search_catalogs
+from export_sinks import EXPORT_FORMATS, ExportSinks
+from html_gallery import HtmlGallery
+from browser_preview import BrowserPreview, PREVIEW_FPS, PREVIEW_SIZE
+from thumbnail_pane import ThumbnailGrid
+from progress_model import ProgressModel, expected_history_start, format_progress
+from run_control import RunControl, ScrapeCancelled
+from chromedriver_cache import ChromeDriverCache
+
+# Selenium, requests (via download_engine) and numpy (via near_duplicates) are imported where
+# they are used, not here, so the window opens quickly - warm_up_imports loads the scrape's ones
+# in the background once it is showing; webdriver-manager is only needed on a ChromeDriver cache miss
+startup_report.mark("modules imported")
 
 # Configuration
 LOGIN_URL = 'https://parentportal.parenta.com/carer-login'
@@ -40,6 +53,55 @@ MAIN_IMAGE_SELECTOR = "img"
 GALLERY_INDICATOR_SELECTOR = "[class*='circle']"
 PHOTO_CONTAINER_SELECTOR = "div[class*='photo'], div[class*='image-area']"
 
+# Send If-None-Match/If-Modified-Since for already-downloaded images on every run.
+# Off by default - known URLs are linked from the store with no request; use "Verify Library" instead.
+REVALIDATE_KNOWN_IMAGES = False
+
+# ChromeDriver is cached per Chrome major version and only downloaded when Chrome moves to a new
+# one; set True (or start with --refresh-chromedriver) to fetch a fresh driver anyway
+REFRESH_CHROMEDRIVER = False
+
+# Number of posts processed by the Test button
+TEST_POST_LIMIT = 50
+
+# Full mode gives up after this many scroll rounds; also the fallback yardstick for progress
+MAX_SCROLL_ATTEMPTS = 80
+
+# Newest containers are left for the next scroll round so their lazy-loaded images have settled
+EXTRACTION_HOLDBACK = 10
+
+# Rebuild the "By month" / "By activity" hard-link views in the download folder after each run
+BUILD_LIBRARY_VIEWS = True
+
+# Refresh the offline HTML gallery (Gallery/index.html in the download folder) after each run
+BUILD_HTML_GALLERY = True
+
+# Status log: the GUI drains queued lines this often and keeps only the newest MAX_LOG_LINES;
+# everything also goes to a rotating log file in the image store folder
+LOG_PUMP_INTERVAL_MS = 100
+MAX_LOG_LINES = 2000
+LOG_FILE_NAME = "parenta_scraper.log"
+LOG_FILE_MAX_BYTES = 5 * 1024 * 1024
+LOG_FILE_BACKUPS = 3
+
+PROGRESS_UPDATE_MS = 1000  # Progress bar, rates and ETA refresh
+THUMBNAIL_UPDATE_MS = 250  # Photos pane refresh while it is showing
+
+# Slow modules loaded in the background shortly after the window appears, so the first
+# scrape doesn't wait for them
+STARTUP_WARMUP_DELAY_MS = 500
+WARMUP_MODULES = (
+    "selenium.webdriver",
+    "selenium.webdriver.chrome.service",
+    "selenium.webdriver.support.ui",
+    "selenium.webdriver.support.expected_conditions",
+    "selenium.webdriver.common.action_chains",
+    "download_engine",
+)
+
+# "Save space" choices shown in the GUI, mapped to post_processing.TRANSCODE_FORMATS keys
+TRANSCODE_CHOICES = {"Off": None, "WebP": "webp", "AVIF": "avif", "Smaller JPEG": "jpeg"}
+
 def show_error_dialog(parent, title, message):
     """Show a custom error dialog using customtkinter"""
     dialog = ctk.CTkToplevel(parent)
@@ -70,6 +132,42 @@ def show_error_dialog(parent, title, message):
     dialog.focus_set()
     dialog.wait_window()
 
+def show_confirm_dialog(parent, title, message, confirm_text="OK"):
+    """Ask the user to confirm an action; returns True only if they click confirm_text"""
+    dialog = ctk.CTkToplevel(parent)
+    dialog.title(title)
+    dialog.geometry("420x220")
+    dialog.resizable(False, False)
+    dialog.transient(parent)
+    dialog.grab_set()
+    
+    # Center the dialog
+    dialog.update_idletasks()
+    x = (dialog.winfo_screenwidth() // 2) - (420 // 2)
+    y = (dialog.winfo_screenheight() // 2) - (220 // 2)
+    dialog.geometry(f"420x220+{x}+{y}")
+    
+    message_label = ctk.CTkLabel(dialog, text=message, font=ctk.CTkFont(size=14), wraplength=380)
+    message_label.pack(pady=(30, 10), padx=20)
+    
+    confirmed = [False]
+    
+    def confirm():
+        confirmed[0] = True
+        dialog.destroy()
+    
+    button_frame = ctk.CTkFrame(dialog, fg_color="transparent")
+    button_frame.pack(pady=20)
+    cancel_button = ctk.CTkButton(button_frame, text="Cancel", command=dialog.destroy, width=100)
+    cancel_button.pack(side="left", padx=10)
+    confirm_button = ctk.CTkButton(button_frame, text=confirm_text, command=confirm, width=100,
+                                   fg_color="#a33", hover_color="#822")
+    confirm_button.pack(side="left", padx=10)
+    
+    dialog.focus_set()
+    dialog.wait_window()
+    return confirmed[0]
+
 class ParentaScraper:
     def __init__(self, root):
         self.root = root
@@ -86,7 +184,57 @@ class ParentaScraper:
         self.password_var = ctk.StringVar()
         self.is_running = False
         
+        # Any thread can log; only the Tk thread touches the textbox (see pump_log)
+        self.log_queue = queue.SimpleQueue()
+        self.file_log = self.create_file_log()
+        
+        # Browser frames are captured cheaply on the scraper thread and decoded in the background
+        self.preview = BrowserPreview()
+        self.preview_frame_id = 0
+        
+        # Set by the scraper thread for each run; the GUI reads snapshots of it (see pump_progress)
+        self.progress_model = None
+        # Fraction done of the running library tool, set by its worker thread (see pump_progress)
+        self.library_progress = None
+        # Pause/Cancel flags for the current scrape, checked by the scraper and download threads
+        self.run_control = None
+        
         self.setup_ui()
+        self.root.after(LOG_PUMP_INTERVAL_MS, self.pump_log)
+        self.root.after(1000 // PREVIEW_FPS, self.pump_preview)
+        self.root.after(PROGRESS_UPDATE_MS, self.pump_progress)
+        self.root.after(THUMBNAIL_UPDATE_MS, self.pump_thumbnails)
+        self.root.after_idle(self.on_window_ready)
+        
+    def on_window_ready(self):
+        """First idle moment after the window is drawn: log startup time, then warm the slow imports"""
+        elapsed = startup_report.mark("window ready")
+        self.file_log.info(f"Window ready in {elapsed:.2f}s (budget {startup_report.STARTUP_BUDGET_SECONDS}s)")
+        if elapsed > startup_report.STARTUP_BUDGET_SECONDS:
+            self.file_log.warning("Startup is over budget - run with PARENTA_STARTUP_REPORT=1 to see why")
+        self.root.after(STARTUP_WARMUP_DELAY_MS, self.start_warm_up)
+        
+    def start_warm_up(self):
+        threading.Thread(target=self.warm_up_imports, name="warm-up", daemon=True).start()
+        
+    def warm_up_imports(self):
+        """Import the modules a scrape needs in the background, then report startup if asked"""
+        for name in WARMUP_MODULES:
+            try:
+                importlib.import_module(name)
+            except Exception as e:
+                self.log_message(f"Could not load {name}: {e}")
+        startup_report.mark("background imports loaded")
+        if startup_report.requested():
+            for line in startup_report.report_lines():
+                self.log_message(line)
+            report_path = default_store_root() / "startup_importtime.txt"
+            try:
+                os.makedirs(report_path.parent, exist_ok=True)
+                startup_report.write_importtime(report_path)
+                self.log_message(f"Full import timings saved to: {report_path}")
+            except OSError as e:
+                self.log_message(f"Could not save import timings: {e}")
         
     def setup_ui(self):
         # Main frame with two columns
@@ -132,7 +280,7 @@ class ParentaScraper:
         # Test button (first 50)
         self.test_button = ctk.CTkButton(
             button_frame, 
-            text="Test (First 50)", 
+            text=f"Test (First {TEST_POST_LIMIT})", 
             command=self.run_test,
             width=150,
             height=40,
@@ -151,11 +299,157 @@ class ParentaScraper:
         )
         self.full_button.pack(side="left", padx=10, pady=10)
         
+        # Pause/Resume and Cancel - only enabled while a scrape is running
+        self.pause_button = ctk.CTkButton(
+            button_frame, 
+            text="Pause", 
+            command=self.toggle_pause,
+            width=100,
+            height=40,
+            font=ctk.CTkFont(size=14),
+            state="disabled"
+        )
+        self.pause_button.pack(side="left", padx=10, pady=10)
+        
+        self.cancel_button = ctk.CTkButton(
+            button_frame, 
+            text="Cancel", 
+            command=self.cancel_scrape,
+            width=100,
+            height=40,
+            font=ctk.CTkFont(size=14),
+            fg_color="#a33",
+            hover_color="#822",
+            state="disabled"
+        )
+        self.cancel_button.pack(side="left", padx=10, pady=10)
+        
+        # Library tools - these work on already downloaded data and don't open Chrome
+        tools_frame = ctk.CTkFrame(left_frame)
+        tools_frame.pack(fill="x", padx=20, pady=(0, 20))
+        
+        # Verify library button
+        self.verify_button = ctk.CTkButton(
+            tools_frame, 
+            text="Verify Library", 
+            command=self.run_verify,
+            width=150,
+            height=40,
+            font=ctk.CTkFont(size=14)
+        )
+        self.verify_button.pack(side="left", padx=10, pady=10)
+        
+        # Retry failed downloads button
+        self.retry_button = ctk.CTkButton(
+            tools_frame, 
+            text="Retry Failures", 
+            command=self.run_retry_failures,
+            width=150,
+            height=40,
+            font=ctk.CTkFont(size=14)
+        )
+        self.retry_button.pack(side="left", padx=10, pady=10)
+        
+        # Near-duplicate finder button
+        self.duplicates_button = ctk.CTkButton(
+            tools_frame, 
+            text="Find Duplicates", 
+            command=self.run_find_duplicates,
+            width=150,
+            height=40,
+            font=ctk.CTkFont(size=14)
+        )
+        self.duplicates_button.pack(side="left", padx=10, pady=10)
+        
+        self.link_duplicates_var = ctk.BooleanVar(value=False)
+        self.link_duplicates_check = ctk.CTkCheckBox(tools_frame, text="Link duplicates", variable=self.link_duplicates_var)
+        self.link_duplicates_check.pack(side="left", padx=10, pady=10)
+        
+        # Optional space-saving transcode of new photos
+        space_frame = ctk.CTkFrame(left_frame)
+        space_frame.pack(fill="x", padx=20, pady=(0, 20))
+        
+        space_label = ctk.CTkLabel(space_frame, text="Save space:", font=ctk.CTkFont(size=14))
+        space_label.pack(side="left", padx=10, pady=10)
+        
+        self.transcode_var = ctk.StringVar(value="Off")
+        self.transcode_menu = ctk.CTkOptionMenu(
+            space_frame, 
+            values=list(TRANSCODE_CHOICES), 
+            variable=self.transcode_var,
+            width=150
+        )
+        self.transcode_menu.pack(side="left", padx=10, pady=10)
+        
+        self.keep_originals_var = ctk.BooleanVar(value=True)
+        self.keep_originals_check = ctk.CTkCheckBox(space_frame, text="Keep originals", variable=self.keep_originals_var)
+        self.keep_originals_check.pack(side="left", padx=10, pady=10)
+        
+        # Folder layout for downloaded files
+        layout_label = ctk.CTkLabel(space_frame, text="Folders:", font=ctk.CTkFont(size=14))
+        layout_label.pack(side="left", padx=10, pady=10)
+        
+        self.layout_var = ctk.StringVar(value=DEFAULT_LAYOUT)
+        self.layout_menu = ctk.CTkOptionMenu(
+            space_frame, 
+            values=list(LAYOUTS), 
+            variable=self.layout_var,
+            width=150
+        )
+        self.layout_menu.pack(side="left", padx=10, pady=10)
+        
+        # Exports written alongside the download folder
+        export_frame = ctk.CTkFrame(left_frame)
+        export_frame.pack(fill="x", padx=20, pady=(0, 20))
+        
+        archive_label = ctk.CTkLabel(export_frame, text="Archive:", font=ctk.CTkFont(size=14))
+        archive_label.pack(side="left", padx=10, pady=10)
+        
+        self.archive_var = ctk.StringVar(value="None")
+        self.archive_menu = ctk.CTkOptionMenu(
+            export_frame, 
+            values=list(ARCHIVE_FORMATS), 
+            variable=self.archive_var,
+            width=150
+        )
+        self.archive_menu.pack(side="left", padx=10, pady=10)
+        
+        # Post data exports - any combination, all written in one pass
+        self.export_vars = {}
+        self.export_checks = []
+        for name in EXPORT_FORMATS:
+            self.export_vars[name] = ctk.BooleanVar(value=(name == "CSV"))
+            export_check = ctk.CTkCheckBox(export_frame, text=name, variable=self.export_vars[name])
+            export_check.pack(side="left", padx=10, pady=10)
+            self.export_checks.append(export_check)
+        
+        # Search over downloaded posts (works during a scrape too)
+        search_frame = ctk.CTkFrame(left_frame)
+        search_frame.pack(fill="x", padx=20, pady=(0, 20))
+        
+        self.search_var = ctk.StringVar()
+        search_entry = ctk.CTkEntry(search_frame, textvariable=self.search_var, placeholder_text="Search posts, e.g. farm trip", width=300, height=35)
+        search_entry.pack(side="left", padx=10, pady=10)
+        search_entry.bind("<Return>", lambda event: self.run_search())
+        
+        search_button = ctk.CTkButton(
+            search_frame, 
+            text="Search", 
+            command=self.run_search,
+            width=100,
+            height=35,
+            font=ctk.CTkFont(size=14)
+        )
+        search_button.pack(side="left", padx=10, pady=10)
+        
         # Progress bar
         self.progress = ctk.CTkProgressBar(left_frame)
-        self.progress.pack(fill="x", padx=20, pady=10)
+        self.progress.pack(fill="x", padx=20, pady=(10, 0))
         self.progress.set(0)
         
+        self.progress_label = ctk.CTkLabel(left_frame, text="", anchor="w", font=ctk.CTkFont(size=12))
+        self.progress_label.pack(fill="x", padx=20, pady=(0, 10))
+        
         # Status text frame
         status_frame = ctk.CTkFrame(left_frame)
         status_frame.pack(fill="both", expand=True, padx=20, pady=10)
@@ -168,47 +462,149 @@ class ParentaScraper:
         self.status_text = ctk.CTkTextbox(status_frame, width=500, height=300, font=emoji_font)
         self.status_text.pack(fill="both", expand=True, padx=10, pady=(0, 10))
         
-        # Screenshot display area
-        screenshot_label = ctk.CTkLabel(right_frame, text="Browser View:", font=ctk.CTkFont(size=14, weight="bold"))
-        screenshot_label.pack(pady=(20, 10))
+        # Switch the right-hand pane between the browser and the photos downloaded so far
+        self.pane_switch = ctk.CTkSegmentedButton(right_frame, values=["Browser View", "Photos"], command=self.show_pane)
+        self.pane_switch.set("Browser View")
+        self.pane_switch.pack(pady=(20, 10))
         
         # Screenshot display
-        self.screenshot_label = ctk.CTkLabel(right_frame, text="No screenshot yet", width=500, height=600)
+        self.screenshot_label = ctk.CTkLabel(right_frame, text="No screenshot yet", width=PREVIEW_SIZE[0], height=PREVIEW_SIZE[1])
         self.screenshot_label.pack(padx=10, pady=10)
         
+        # Live thumbnails - only the visible tiles are drawn, so thousands of photos stay smooth
+        self.thumbnails = ThumbnailGrid(right_frame, width=PREVIEW_SIZE[0], height=PREVIEW_SIZE[1])
+        
+    def show_pane(self, choice):
+        """Show either the browser preview or the live photo thumbnails"""
+        if choice == "Photos":
+            self.screenshot_label.pack_forget()
+            self.thumbnails.pack(padx=10, pady=10)
+            self.thumbnails.refresh()
+        else:
+            self.thumbnails.pack_forget()
+            self.screenshot_label.pack(padx=10, pady=10)
+        
+    def pump_thumbnails(self):
+        """Fill in newly downloaded photos while the Photos pane is showing (Tk thread only)"""
+        try:
+            if self.pane_switch.get() == "Photos":
+                self.thumbnails.refresh()
+        except Exception as e:
+            self.log_message(f"Thumbnail update failed: {e}")
+        self.root.after(THUMBNAIL_UPDATE_MS, self.pump_thumbnails)
+        
+    def on_photo_ready(self, url, dest_path, result, fingerprint, post_data):
+        """Post-processor listener: queue each finished photo for the Photos pane"""
+        if result != 'failed' and not is_video_url(url):
+            self.thumbnails.add(dest_path)
+        
+    def create_file_log(self):
+        """Rotating file logger for the full status log"""
+        logger = logging.getLogger("parenta_scraper")
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        if not logger.handlers:
+            try:
+                log_dir = default_store_root()
+                os.makedirs(log_dir, exist_ok=True)
+                handler = RotatingFileHandler(log_dir / LOG_FILE_NAME, maxBytes=LOG_FILE_MAX_BYTES,
+                                              backupCount=LOG_FILE_BACKUPS, encoding='utf-8')
+                handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+                logger.addHandler(handler)
+            except OSError:
+                pass  # The GUI log still works without a file
+        return logger
+        
     def log_message(self, message):
-        """Add message to status text"""
-        self.status_text.insert("end", f"{message}\n")
-        self.status_text.see("end")
-        self.root.update_idletasks()
+        """Queue a status line - safe to call from any thread"""
+        self.log_queue.put(message)
+        self.file_log.info(message)
         
-    def take_screenshot(self, driver):
-        """Take a screenshot and update the GUI"""
+    def pump_log(self):
+        """Move queued log lines into the textbox in one batch, then reschedule (Tk thread only)"""
+        lines = []
         try:
-            # Take screenshot as PNG bytes
-            screenshot_png = driver.get_screenshot_as_png()
-            
-            # Convert to PIL Image
-            image = Image.open(io.BytesIO(screenshot_png))
-            
-            # Resize to fit in the GUI (500x600 area)
-            image.thumbnail((500, 600), Image.Resampling.LANCZOS)
-            
-            # Convert to CTkImage for CustomTkinter
-            photo = ctk.CTkImage(light_image=image, dark_image=image, size=image.size)
-            
-            # Update GUI in main thread
-            self.root.after(0, self.update_screenshot, photo)
-            
+            while True:
+                lines.append(self.log_queue.get_nowait())
+        except queue.Empty:
+            pass
+        if lines:
+            lines = lines[-MAX_LOG_LINES:]
+            self.status_text.insert("end", "\n".join(lines) + "\n")
+            # Keep the textbox bounded so Tk stays fast on long runs
+            line_count = int(self.status_text.index("end-1c").split('.')[0])
+            if line_count > MAX_LOG_LINES:
+                self.status_text.delete("1.0", f"{line_count - MAX_LOG_LINES}.0")
+            self.status_text.see("end")
+        self.root.after(LOG_PUMP_INTERVAL_MS, self.pump_log)
+        
+    def take_screenshot(self, driver, force=False):
+        """Capture a small preview frame - rate-limited, and decoded off the scraper thread"""
+        try:
+            self.preview.capture(driver, force)
         except Exception as e:
             self.log_message(f"Screenshot failed: {e}")
     
-    def update_screenshot(self, photo):
-        """Update the screenshot in the GUI (must be called from main thread)"""
+    def pump_preview(self):
+        """Show the newest decoded browser frame, if any (Tk thread only)"""
         try:
-            self.screenshot_label.configure(image=photo, text="")
+            frame = self.preview.take_frame(self.preview_frame_id)
+            if frame:
+                self.preview_frame_id, image = frame
+                photo = ctk.CTkImage(light_image=image, dark_image=image, size=image.size)
+                self.screenshot_label.configure(image=photo, text="")
         except Exception as e:
             self.log_message(f"Screenshot update failed: {e}")
+        self.root.after(1000 // PREVIEW_FPS, self.pump_preview)
+        
+    def pump_progress(self):
+        """Move the progress bar and refresh rates/ETA from the current run's model (Tk thread only)"""
+        model = self.progress_model
+        if model:
+            snapshot = model.snapshot()
+            self.progress.set(snapshot['fraction'])
+            text = format_progress(snapshot)
+            control = self.run_control
+            if control and control.paused:
+                text = f"Paused · {text}"
+            self.progress_label.configure(text=text)
+        elif self.library_progress is not None:
+            self.progress.set(self.library_progress)
+        self.root.after(PROGRESS_UPDATE_MS, self.pump_progress)
+        
+    def toggle_pause(self):
+        """Pause or resume the running scrape at its next safe point"""
+        control = self.run_control
+        if not control or control.cancelled:
+            return
+        if control.paused:
+            control.resume()
+            self.pause_button.configure(text="Pause")
+            self.log_message("▶ Resumed")
+        else:
+            control.pause()
+            self.pause_button.configure(text="Resume")
+            self.log_message("⏸ Paused - scrolling and new downloads wait; downloads in progress finish")
+        
+    def cancel_scrape(self):
+        """Stop the running scrape cleanly: in-flight downloads finish, everything is saved, Chrome closes"""
+        control = self.run_control
+        if not control or control.cancelled:
+            return
+        control.cancel()
+        self.pause_button.configure(state="disabled", text="Pause")
+        self.cancel_button.configure(state="disabled")
+        self.log_message("⏹ Cancelling - saving what has been downloaded so far...")
+        
+    def on_close(self):
+        """Window closed: cancel a running scrape and wait for it to clean up before exiting"""
+        if self.is_running and self.run_control:
+            self.cancel_scrape()
+            self.root.after(200, self.on_close)
+            return
+        self.preview.close()
+        self.thumbnails.close()
+        self.root.destroy()
         
     def run_test(self):
         """Run test scrape (first 50 items)"""
@@ -222,6 +618,24 @@ class ParentaScraper:
             return
         self.start_scraping("full")
         
+    def create_post_processor(self, image_store, pipeline):
+        """PostProcessor with the transcode settings chosen in the GUI"""
+        return PostProcessor(
+            image_store, 
+            pipeline, 
+            log=self.log_message,
+            transcode=TRANSCODE_CHOICES[self.transcode_var.get()],
+            keep_originals=self.keep_originals_var.get()
+        )
+        
+    def set_buttons_state(self, state):
+        """Enable or disable all action buttons together"""
+        for button in (self.test_button, self.full_button, self.verify_button, self.retry_button,
+                       self.duplicates_button, self.link_duplicates_check,
+                       self.transcode_menu, self.keep_originals_check, self.layout_menu,
+                       self.archive_menu, *self.export_checks):
+            button.configure(state=state)
+        
     def start_scraping(self, mode):
         """Start scraping in a separate thread"""
         if not self.username_var.get() or not self.password_var.get():
@@ -229,10 +643,13 @@ class ParentaScraper:
             return
             
         self.is_running = True
-        self.test_button.configure(state='disabled')
-        self.full_button.configure(state='disabled')
+        self.set_buttons_state('disabled')
         self.progress.set(0)
-        self.progress.start()
+        self.progress_label.configure(text="")
+        self.run_control = RunControl()
+        self.thumbnails.clear()
+        self.pause_button.configure(state="normal", text="Pause")
+        self.cancel_button.configure(state="normal")
         
         # Clear status
         self.status_text.delete("1.0", "end")
@@ -268,6 +685,8 @@ class ParentaScraper:
             
     def create_chrome_options(self):
         """Create Chrome options for headed mode with screenshot capability"""
+        from selenium.webdriver.chrome.options import Options
+        
         chrome_options = Options()
         
         # Minimal options for WSL2 - keep only what's essential for the working configuration
@@ -362,34 +781,41 @@ class ParentaScraper:
         self.log_message(f"Chrome guidance: {message}")
         # Don't show dialog yet - just log. We'll show dialog on actual failure
         
-    def get_chromedriver_service(self):
-        """Get ChromeDriver service using webdriver-manager for automatic management"""
-        try:
-            self.log_message("Setting up ChromeDriver automatically...")
-            driver_path = ChromeDriverManager().install()
+    def get_chromedriver_service(self, chrome_binary=None, refresh=False):
+        """ChromeDriver service for the installed Chrome - cached per version, downloaded only on a miss"""
+        from selenium.webdriver.chrome.service import Service as ChromeService
+        
+        self.log_message("Setting up ChromeDriver...")
+        driver_path = ChromeDriverCache(log=self.log_message).resolve(chrome_binary, refresh=refresh)
+        if driver_path:
             self.log_message(f"ChromeDriver ready at: {driver_path}")
             return ChromeService(executable_path=driver_path)
-        except Exception as e:
-            self.log_message(f"Webdriver-manager failed: {e}")
-            # Fallback to manual detection
-            self.log_message("Falling back to manual ChromeDriver detection...")
-            chromedriver_paths = [
-                "/usr/bin/chromedriver",  # Linux/WSL2
-                "chromedriver",           # System PATH
-                "C:\\chromedriver.exe",   # Windows
-            ]
-            
-            for path in chromedriver_paths:
-                if os.path.exists(path):
-                    self.log_message(f"Found ChromeDriver at: {path}")
-                    return ChromeService(executable_path=path)
-                    
-            self.log_message("Warning: ChromeDriver not found, using system PATH")
-            return ChromeService(executable_path="chromedriver")
+        self.log_message("Warning: ChromeDriver not found, using system PATH")
+        return ChromeService(executable_path="chromedriver")
         
     def scraper_worker(self, mode):
         """Main scraping logic with improved error handling"""
+        # Deferred from startup (see WARMUP_MODULES) - usually already loaded by now
+        from selenium import webdriver
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support.ui import WebDriverWait
+        from selenium.webdriver.support import expected_conditions as EC
+        from selenium.common.exceptions import WebDriverException, TimeoutException
+        from selenium.webdriver.common.action_chains import ActionChains
+        from selenium.webdriver.common.keys import Keys
+        from download_engine import DownloadPipeline
+        
         driver = None
+        pipeline = None
+        post_processor = None
+        library_index = None
+        archive_sink = None
+        catalog = None
+        exports = None
+        progress = self.create_progress_model(mode)
+        control = self.run_control
+        run_status = 'failed'
+        total_scraped = 0
         try:
             self.log_message("Setting up platform environment...")
             self.setup_platform_environment()
@@ -404,16 +830,25 @@ class ParentaScraper:
             if chrome_binary:
                 chrome_options.binary_location = chrome_binary
             
-            # Get ChromeDriver service (auto-managed)
-            service = self.get_chromedriver_service()
+            # Get ChromeDriver service (cached per Chrome version - offline unless it's a new version)
+            refresh_driver = REFRESH_CHROMEDRIVER or "--refresh-chromedriver" in sys.argv
+            service = self.get_chromedriver_service(chrome_binary, refresh=refresh_driver)
             
             # Create driver with better error handling
             try:
-                driver = webdriver.Chrome(service=service, options=chrome_options)
+                try:
+                    driver = webdriver.Chrome(service=service, options=chrome_options)
+                except WebDriverException as e:
+                    if refresh_driver:
+                        raise
+                    # A cached driver that won't start (damaged, or Chrome changed under it) - fetch a fresh one once
+                    self.log_message(f"Cached ChromeDriver failed to start Chrome: {str(e)[:200]}")
+                    service = self.get_chromedriver_service(chrome_binary, refresh=True)
+                    driver = webdriver.Chrome(service=service, options=chrome_options)
                 self.log_message("✅ Chrome browser started in headed mode!")
                 self.log_message("📌 INFO: Chrome window opened - you can minimize it if it appears on screen")
             except WebDriverException as e:
-                self.log_message(f"Failed to start Chrome with webdriver-manager: {e}")
+                self.log_message(f"Failed to start Chrome with ChromeDriver: {e}")
                 # Fallback: try without explicit service
                 try:
                     driver = webdriver.Chrome(options=chrome_options)
@@ -446,20 +881,22 @@ class ParentaScraper:
                 self.log_message("Login page loaded successfully")
                 
                 # Take initial screenshot
-                self.take_screenshot(driver)
+                self.take_screenshot(driver, force=True)
                 
             except Exception as e:
                 self.log_message(f"Error loading login page: {e}")
                 # Try refreshing the page
                 try:
                     driver.refresh()
-                    time.sleep(3)
+                    control.sleep(3)
                     self.log_message("Page refreshed successfully")
                     self.take_screenshot(driver)
                 except Exception as refresh_error:
                     raise Exception(f"Failed to load login page: {e}. Refresh also failed: {refresh_error}")
             
+            control.checkpoint()
             self.log_message("Logging in...")
+            progress.set_phase("Logging in")
             
             # Wait for username field with longer timeout and try multiple selectors
             username_field = None
@@ -472,6 +909,7 @@ class ParentaScraper:
             ]
             
             for selector in username_selectors:
+                control.checkpoint()
                 try:
                     self.log_message(f"Trying username selector: {selector}")
                     username_field = WebDriverWait(driver, 5).until(
@@ -560,8 +998,8 @@ class ParentaScraper:
             self.log_message("Login button clicked")
             
             # Take screenshot after login
-            time.sleep(2)
-            self.take_screenshot(driver)
+            control.sleep(2)
+            self.take_screenshot(driver, force=True)
             
             # Wait for successful login and dashboard to load
             try:
@@ -580,7 +1018,7 @@ class ParentaScraper:
                     self.log_message("Dashboard elements not found, but proceeding...")
                 
                 # Additional wait for page to stabilize
-                time.sleep(3)
+                control.sleep(3)
                 
                 # Check if we're actually logged in
                 current_url = driver.current_url
@@ -626,8 +1064,8 @@ class ParentaScraper:
                     self.log_message("Newsfeed loaded via direct URL")
                     
                 # Take screenshot of newsfeed
-                time.sleep(2)
-                self.take_screenshot(driver)
+                control.sleep(2)
+                self.take_screenshot(driver, force=True)
                 
             except TimeoutException:
                 # Check if we're still on login page (login failed)
@@ -636,26 +1074,50 @@ class ParentaScraper:
                 else:
                     raise Exception("Login successful but newsfeed not found")
             
-            # Setup CSV file for data export
-            home_directory = Path.home()
-            csv_filename = home_directory / f"Nursery_Data_{mode.capitalize()}.csv"
-            
-            # Create CSV file with headers
-            with open(csv_filename, 'w', newline='', encoding='utf-8') as csvfile:
-                csv_writer = csv.writer(csvfile)
-                csv_writer.writerow(['Date', 'Time', 'Event_Type', 'Content', 'Image_Count'])
+            control.checkpoint()
             
-            self.log_message(f"Created CSV file: {csv_filename}")
+            # Open the data exports once for the whole run - each buffers and flushes on its own
+            home_directory = Path.home()
+            export_formats = [name for name, var in self.export_vars.items() if var.get()]
+            exports = ExportSinks(home_directory / f"Nursery_Data_{mode.capitalize()}", export_formats)
+            for path in exports.paths:
+                self.log_message(f"Created export file: {path}")
             
             # Initialize tracking variables
             processed_containers = set()  # Track processed container IDs
-            total_scraped = 0
             total_images_downloaded = 0
-            csv_batch = []  # Batch CSV writes
-            image_batch = []  # Batch image downloads
+            image_store = ImageStore()  # Shared across modes and runs - known URLs are never re-fetched
+            self.log_message(f"Image store: {len(image_store.entries)} images already downloaded")
+            download_dir = self.get_download_dir(mode)
+            layout = self.layout_var.get()
+            # Maps each post to its files so lookups never have to list the (sharded) folders
+            library_index = LibraryIndex(download_dir)
+            
+            # Both modes share one download path; in full mode downloads start while we are still
+            # scrolling - the queue is bounded so memory stays flat
+            pipeline = DownloadPipeline(image_store, revalidate=REVALIDATE_KNOWN_IMAGES, log=self.log_message,
+                                        control=control)
+            # Verifies, date-stamps (and optionally transcodes) each new photo on the other cores as soon as it lands
+            post_processor = self.create_post_processor(image_store, pipeline)
+            progress.pipeline = pipeline
+            # Index and archive only see files once post-processing has finished with them
+            post_processor.add_listener(library_index.on_downloaded)
+            post_processor.add_listener(self.on_photo_ready)
+            # SQLite catalog of posts, images, download state and runs, next to the CSV
+            catalog = Catalog(home_directory / f"Nursery_Data_{mode.capitalize()}.db", mode, image_store, log=self.log_message)
+            post_processor.add_listener(catalog.on_downloaded)
+            archive_extension = ARCHIVE_FORMATS[self.archive_var.get()]
+            if archive_extension:
+                archive_path = Path.home() / f"Nursery_Archive_{mode.capitalize()}{archive_extension}"
+                archive_sink = ArchiveSink(archive_path, download_dir, log=self.log_message)
+                post_processor.add_listener(archive_sink.on_downloaded)
+            pipeline_start = time.time()
             
             if mode == "full":
+                extracted_until = 0  # Containers before this index have been extracted and queued
+                
                 self.log_message("Loading all history using simple infinite scroll...")
+                progress.set_phase("Loading posts")
                 
                 # Simple infinite scroll approach - track containers, not just height
                 last_height = driver.execute_script("return document.body.scrollHeight")
@@ -666,11 +1128,14 @@ class ParentaScraper:
                 self.log_message(f"Initial container count: {last_container_count}")
                 
                 scroll_attempts = 0
-                max_scroll_attempts = 80 
+                max_scroll_attempts = MAX_SCROLL_ATTEMPTS
                 no_new_content_attempts = 0
                 max_no_content_attempts = 3  # Stop after 3 attempts with no new content
                 
                 while scroll_attempts < max_scroll_attempts:
+                    # Waits here while paused; raises ScrapeCancelled once cancelled
+                    control.checkpoint()
+                    
                     # Get current scroll position and page info for debugging
                     current_scroll = driver.execute_script("return window.pageYOffset;")
                     viewport_height = driver.execute_script("return window.innerHeight;")
@@ -678,9 +1143,8 @@ class ParentaScraper:
                     
                     self.log_message(f"Before scroll {scroll_attempts + 1}: scroll={current_scroll}, viewport={viewport_height}, page={page_height}")
                     
-                    # Take screenshot before scrolling
-                    if scroll_attempts % 50 == 0:  # Every 50 scrolls to avoid too many screenshots
-                        self.take_screenshot(driver)
+                    # Preview frame before scrolling - cheap, and rate-limited to PREVIEW_FPS
+                    self.take_screenshot(driver)
                     
                     scroll_success = False
                     
@@ -698,18 +1162,18 @@ class ParentaScraper:
                         
                         for i in range(20):
                             actions.scroll_by_amount(0, 700).perform()
-                            time.sleep(0.1)
+                            control.sleep(0.1)
                             
                         for i in range(8):
                             body.send_keys(Keys.PAGE_DOWN)
-                            time.sleep(0.1)
+                            control.sleep(0.1)
                         
                         body.send_keys(Keys.END)
-                        time.sleep(0.2)
+                        control.sleep(0.2)
                         
                         for i in range(20):
                             body.send_keys(Keys.ARROW_DOWN)
-                            time.sleep(0.05)
+                            control.sleep(0.05)
                         
                         self.log_message("✓ Method 1: ActionChains + keyboard scroll completed")
                         scroll_success = True
@@ -762,7 +1226,8 @@ class ParentaScraper:
                         
                         # Wait up to 10 seconds for new containers to appear
                         wait = WebDriverWait(driver, 10)
-                        wait.until(lambda d: len(d.find_elements(By.CSS_SELECTOR, NEWSFEED_ITEM_SELECTOR)) > current_container_count)
+                        wait.until(lambda d: control.cancelled or len(d.find_elements(By.CSS_SELECTOR, NEWSFEED_ITEM_SELECTOR)) > current_container_count)
+                        control.checkpoint()
                         
                         new_container_count = len(driver.find_elements(By.CSS_SELECTOR, NEWSFEED_ITEM_SELECTOR))
                         self.log_message(f"✓ WebDriverWait: Containers increased from {current_container_count} to {new_container_count}")
@@ -774,12 +1239,12 @@ class ParentaScraper:
                         self.log_message(f"✗ WebDriverWait failed: {e}")
                     
                     # Wait a moment and check new position
-                    time.sleep(2)
+                    control.sleep(2)
                     new_scroll = driver.execute_script("return window.pageYOffset;")
                     self.log_message(f"After scroll: position={new_scroll}")
                     
                     # Wait for new content to load
-                    time.sleep(3)  # Wait for lazy loading
+                    control.sleep(3)  # Wait for lazy loading
                     
                     # Calculate new scroll height and compare with last scroll height
                     new_height = driver.execute_script("return document.body.scrollHeight")
@@ -789,6 +1254,7 @@ class ParentaScraper:
                     current_containers = driver.find_elements(By.CSS_SELECTOR, NEWSFEED_ITEM_SELECTOR)
                     current_container_count = len(current_containers)
                     self.log_message(f"Found {current_container_count} containers after scroll")
+                    progress.scrolled(current_container_count)
                     
                     # Check if we got new containers (this is more reliable than height)
                     if current_container_count > last_container_count:
@@ -800,6 +1266,15 @@ class ParentaScraper:
                         # Take screenshot when new content is loaded
                         self.take_screenshot(driver)
                         
+                        # Extract settled posts now so their images download while we keep scrolling.
+                        # The newest containers are held back until their lazy images have loaded.
+                        settled_count = current_container_count - EXTRACTION_HOLDBACK
+                        if settled_count > extracted_until:
+                            new_posts = extract_all_posts_with_carousel_images_js(driver, NEWSFEED_ITEM_SELECTOR, extracted_until, settled_count)
+                            total_scraped += self.queue_extracted_posts(new_posts, processed_containers, exports, pipeline, download_dir, layout, catalog)
+                            extracted_until = settled_count
+                            self.log_message(f"Queued posts up to {extracted_until}: {pipeline.submitted} images queued, {pipeline.completed} done")
+                        
                     else:
                         no_new_content_attempts += 1
                         self.log_message(f"No new containers loaded (attempt {no_new_content_attempts}/{max_no_content_attempts})")
@@ -810,127 +1285,96 @@ class ParentaScraper:
                     
                     last_height = new_height
                     scroll_attempts += 1
+                    # Scroll rounds without new posts would otherwise leave rows sitting in the buffers
+                    exports.flush(stale_only=True)
+                    post_processor.submit_redownloads()  # Corrupt images found so far download again now
                 
-                self.log_message("Finished loading all content, now processing with batch extractor...")
+                self.log_message("Finished loading all content, extracting remaining posts...")
                 
                 # Take final screenshot of all loaded content
-                self.take_screenshot(driver)
+                self.take_screenshot(driver, force=True)
                 
                 # Use batch extractor for fast data extraction with carousel support
                 self.log_message("Using JavaScript batch extraction with enhanced carousel image support...")
-                all_posts_data = extract_all_posts_with_carousel_images_js(driver, NEWSFEED_ITEM_SELECTOR)
-                self.log_message(f"Batch extracted {len(all_posts_data)} posts")
-                
-                # Process extracted data
-                for i, post_data in enumerate(all_posts_data):
-                    try:
-                        if post_data and post_data.get('id') not in processed_containers:
-                            processed_containers.add(post_data.get('id', f'post_{i}'))
-                            
-                            # Batch CSV data for faster writing
-                            csv_batch.append([
-                                post_data.get('date', ''),
-                                post_data.get('time', ''),
-                                post_data.get('event_type', ''),
-                                post_data.get('content', ''),
-                                len(post_data.get('image_urls', []))
-                            ])
-                            
-                            # Batch image URLs for parallel download later
-                            if post_data.get('image_urls'):
-                                # Log carousel information if available
-                                if post_data.get('has_carousel'):
-                                    self.log_message(f"Carousel detected: {post_data.get('carousel_count', 0)} images in {post_data.get('event_type', 'unknown')}")
-                                
-                                for j, url in enumerate(post_data['image_urls']):
-                                    post_date = post_data.get('date', '').replace('/', '-').replace(':', '-')[:20] if post_data.get('date') else f"post_{total_scraped}"
-                                    post_type = post_data.get('event_type', '') if post_data.get('event_type') else "unknown"
-                                    url_filename = url.split('/')[-1].split('?')[0]
-                                    if not url_filename or '.' not in url_filename:
-                                        url_filename = f"image_{j}.jpg"
-                                    filename = f"{post_date}_{post_type}_{total_scraped}_{j}_{url_filename}"
-                                    image_batch.append((url, filename))
-                            
-                            total_scraped += 1
-                            
-                            # Batch write every 50 posts for better performance
-                            if len(csv_batch) >= 50:
-                                with open(csv_filename, 'a', newline='', encoding='utf-8') as csvfile:
-                                    csv_writer = csv.writer(csvfile)
-                                    csv_writer.writerows(csv_batch)
-                                csv_batch.clear()
-                                self.log_message(f"Batch saved {total_scraped} posts so far...")
-                            
-                            # Progress logging less frequently
-                            if total_scraped % 50 == 0:
-                                self.log_message(f"Processed {total_scraped} posts, {len(image_batch)} images queued")
-                        
-                    except Exception as e:
-                        self.log_message(f"Error processing extracted post {i+1}: {str(e)[:200]}")
-                        continue
+                remaining_posts = extract_all_posts_with_carousel_images_js(driver, NEWSFEED_ITEM_SELECTOR, extracted_until)
+                self.log_message(f"Batch extracted {len(remaining_posts)} remaining posts")
+                total_scraped += self.queue_extracted_posts(remaining_posts, processed_containers, exports, pipeline, download_dir, layout, catalog)
+                progress.discovery_finished()
                     
             else:
-                # Test mode: process first 50 items using batch extractor
-                self.log_message("Test mode: Processing first 50 items with batch extractor...")
-                time.sleep(3)
+                # Test mode: same batched CSV and download pipeline as full mode, limited to the first posts
+                self.log_message(f"Test mode: Processing first {TEST_POST_LIMIT} items with batch extractor...")
+                progress.set_phase("Extracting posts")
+                control.sleep(3)
                 
                 # Use batch extractor for fast data extraction with carousel support
-                all_posts_data = extract_all_posts_with_carousel_images_js(driver, NEWSFEED_ITEM_SELECTOR)
-                test_posts_data = all_posts_data[:50] if len(all_posts_data) > 50 else all_posts_data
-                
+                test_posts_data = extract_all_posts_with_carousel_images_js(driver, NEWSFEED_ITEM_SELECTOR, 0, TEST_POST_LIMIT)
                 self.log_message(f"Processing {len(test_posts_data)} posts in test mode...")
-                
-                for i, post_data in enumerate(test_posts_data):
-                    try:
-                        if post_data:
-                            # Save to CSV
-                            with open(csv_filename, 'a', newline='', encoding='utf-8') as csvfile:
-                                csv_writer = csv.writer(csvfile)
-                                csv_writer.writerow([
-                                    post_data.get('date', ''),
-                                    post_data.get('time', ''),
-                                    post_data.get('event_type', ''),
-                                    post_data.get('content', ''),
-                                    len(post_data.get('image_urls', []))
-                                ])
-                            
-                            # Download images immediately in test mode
-                            if post_data.get('image_urls'):
-                                downloaded_count = self.download_post_images_from_data(post_data, i, mode)
-                                total_images_downloaded += downloaded_count
-                            
-                            total_scraped += 1
-                            self.log_message(f"  Processed post {total_scraped}: {post_data.get('event_type', 'unknown')} - {len(post_data.get('image_urls', []))} images")
-                    
-                    except Exception as e:
-                        self.log_message(f"  Error processing post {i+1}: {str(e)[:200]}")
-                        self.log_message(f"  Error type: {type(e).__name__}")
-                        continue
+                total_scraped += self.queue_extracted_posts(test_posts_data, processed_containers, exports, pipeline, download_dir, layout, catalog)
+                progress.discovery_finished()
             
-
             # Final batch processing
             self.log_message("Processing final batches...")
             
-            # Write any remaining CSV data
-            if csv_batch:
-                with open(csv_filename, 'a', newline='', encoding='utf-8') as csvfile:
-                    csv_writer = csv.writer(csvfile)
-                    csv_writer.writerows(csv_batch)
-                self.log_message(f"Final CSV batch: {len(csv_batch)} posts saved")
+            # Write any buffered post data
+            exports.close()
             
-            # Download all images in parallel batches
-            if image_batch:
-                self.log_message(f"Starting parallel download of {len(image_batch)} images...")
-                total_images_downloaded = self.download_images_parallel(image_batch, mode)
+            # Wait for the download pipeline to drain
+            if pipeline:
+                self.log_message(f"Waiting for {pipeline.submitted - pipeline.completed} remaining downloads...")
+                progress.set_phase("Downloading")
+                post_processor.drain()
+                control.checkpoint()  # Cancelled while waiting - skipped downloads are in the failure log
+                processed = post_processor.close()
+                counts = post_processor.merge_counts(pipeline.close())
+                self.log_message(f"Post-processing: {processed['stamped']} photos date-stamped, {processed['corrupt']} corrupt downloads retried")
+                transcode_report = post_processor.transcode_report()
+                if transcode_report:
+                    self.log_message(transcode_report)
+                total_images_downloaded = counts['downloaded'] + counts['linked'] + counts['unchanged'] + counts['updated']
+                self.log_message(f"{counts['linked']} images were already in the store and were linked without downloading")
+                if counts['failed']:
+                    self.log_message(f"⚠ {counts['failed']} images failed to download - use \"Retry Failures\" to try just those again")
+                
+                # Throughput from a test run is a fair predictor of a full run
+                elapsed = time.time() - pipeline_start
+                if elapsed > 0 and pipeline.submitted:
+                    self.log_message(f"Download throughput: {pipeline.submitted / elapsed:.1f} images/s over {elapsed:.0f}s")
+            progress.set_phase("Finishing")
+            image_store.save()
+            library_index.save()
+            self.log_message(f"Index of {len(library_index.posts)} posts saved to: {library_index.path}")
+            if archive_sink:
+                archived = archive_sink.close(extra_files=[*exports.paths, library_index.path])
+                self.log_message(f"Archive of {archived} files ({archive_sink.bytes_written / 1048576:.0f} MB) saved to: {archive_sink.archive_path}")
+            if BUILD_LIBRARY_VIEWS:
+                views = LibraryViews(library_index)
+                view_counts = views.rebuild()
+                self.log_message(f"Views updated in {views.root}: {view_counts['created']} new links, {view_counts['repaired']} repaired, {view_counts['removed']} removed")
+            if BUILD_HTML_GALLERY:
+                catalog.flush()  # The gallery reads the catalog back through its own connection
+                conn = open_catalog(catalog.path)
+                try:
+                    gallery = HtmlGallery(conn, download_dir)
+                    rebuilt, total_months, thumbnails = gallery.build()
+                finally:
+                    conn.close()
+                self.log_message(f"Gallery: {rebuilt} of {total_months} months rebuilt, {thumbnails} new thumbnails - open {gallery.root / 'index.html'}")
             
             self.log_message(f"✅ Scraping complete! Processed {total_scraped} posts, downloaded {total_images_downloaded} images")
-            self.log_message(f"Data saved to: {csv_filename}")
+            for path in exports.paths:
+                self.log_message(f"Data saved to: {path}")
             self.log_message("🎉 SUCCESS: You can now safely close this application")
+            progress.finish()
+            self.log_message(format_progress(progress.snapshot()))
+            run_status = 'complete'
             
-            # Stop indeterminate animation and fill progress bar to 100% completion
-            self.progress.stop()
-            self.progress.set(1.0)
-            
+        except ScrapeCancelled:
+            run_status = 'cancelled'
+            progress.set_phase("Cancelled")
+            # Let downloads already in progress land (queued ones are skipped) so nothing is half-written
+            if post_processor:
+                post_processor.drain()
         except Exception as e:
             self.log_message(f"❌ Error: {e}")
             self.log_message(f"Error type: {type(e).__name__}")
@@ -939,117 +1383,351 @@ class ParentaScraper:
                 self.log_message(f"Traceback: {traceback.format_exc()}")
             show_error_dialog(self.root, "Error", f"An error occurred: {e}")
         finally:
+            # Chrome is no longer needed by anything below, so close it first
             if driver:
                 try:
                     driver.quit()
                 except:
                     pass
-            self.is_running = False
-            self.test_button.configure(state='normal')
-            self.full_button.configure(state='normal')
-            self.progress.stop()
-            
-    def download_post_images_from_data(self, post_data, post_index, mode):
-        """Download images for a single post from extracted data"""
-        if not post_data.get('image_urls'):
-            return 0
-            
-        try:
-            # Create download directory (single folder for all images)
-            home_directory = Path.home()
-            download_dir_name = f"Nursery_Downloads_{mode.capitalize()}"
-            download_dir = home_directory / download_dir_name
-            os.makedirs(download_dir, exist_ok=True)
+            # Pipeline first: images still queued land and are processed before the pool shuts down
+            counts = None
+            if pipeline:
+                counts = pipeline.close()
+            if post_processor:
+                post_processor.close()
+                if counts:
+                    counts = post_processor.merge_counts(counts)
+            if library_index:
+                library_index.save()
+            if archive_sink and run_status != 'complete':
+                incomplete_path = archive_sink.abort()
+                if incomplete_path:
+                    self.log_message(f"Partial archive of {len(archive_sink.files)} files kept as: {incomplete_path}")
+            if catalog:
+                # Closed only here, so the run's status covers the archive, views and gallery too
+                catalog.close(status=run_status, posts=total_scraped, counts=counts)
+                self.log_message(f"Catalog updated: {catalog.path}")
+            if exports:
+                exports.close()
+            if run_status == 'cancelled':
+                self.log_message(f"⏹ Scrape cancelled - {total_scraped} posts and their finished downloads were saved")
+                if counts and counts['cancelled']:
+                    self.log_message(f"{counts['cancelled']} downloads were skipped - use \"Retry Failures\" to fetch them later")
+            # Widgets belong to the Tk thread
+            self.root.after(0, self.scrape_finished)
             
-            downloaded_count = 0
-            for j, url in enumerate(post_data['image_urls']):
+    def scrape_finished(self):
+        """Re-enable the buttons once the scraper thread has cleaned up (Tk thread)"""
+        self.is_running = False
+        self.run_control = None
+        self.pause_button.configure(state="disabled", text="Pause")
+        self.cancel_button.configure(state="disabled")
+        self.set_buttons_state('normal')
+        
+    def create_progress_model(self, mode):
+        """
+        Progress model for a new run, published to the GUI
+        Full runs size their estimate from the oldest post in the previous run's catalog, if any
+        """
+        history_start = None
+        catalog_path = Path.home() / f"Nursery_Data_{mode.capitalize()}.db"
+        if mode == "full" and catalog_path.exists():
+            try:
+                conn = open_catalog(catalog_path)
                 try:
-                    # Extract filename from URL
-                    url_filename = url.split('/')[-1].split('?')[0]
-                    if not url_filename or '.' not in url_filename:
-                        url_filename = f"image_{j}.jpg"
-                    
-                    # Create descriptive filename with post info
-                    post_date = post_data.get('date', '').replace('/', '-').replace(':', '-')[:20] if post_data.get('date') else f"post_{post_index}"
-                    post_type = post_data.get('event_type', '') if post_data.get('event_type') else "unknown"
-                    
-                    # Flat filename structure: date_type_postindex_imageindex_originalname
-                    filename = download_dir / f"{post_date}_{post_type}_{post_index}_{j}_{url_filename}"
-                    
-                    # Download image
-                    res = requests.get(url, stream=True, timeout=30)
-                    res.raise_for_status()
-                    
-                    with open(filename, 'wb') as f:
-                        f.write(res.content)
-                    
-                    downloaded_count += 1
-                    
-                except Exception as e:
-                    self.log_message(f"  Could not download {url}: {e}")
-                    continue
-            
-            return downloaded_count
+                    history_start = expected_history_start(conn)
+                finally:
+                    conn.close()
+            except Exception as e:
+                self.log_message(f"Could not read previous catalog for progress estimate: {e}")
+        model = ProgressModel(max_scroll_rounds=MAX_SCROLL_ATTEMPTS if mode == "full" else None,
+                              history_start=history_start)
+        self.progress_model = model
+        return model
             
-        except Exception as e:
-            self.log_message(f"Error downloading images for post {post_index}: {e}")
-            return 0
-    
-    def download_images_parallel(self, image_batch, mode):
-        """Download images in parallel batches for much better performance"""
-        import concurrent.futures
-        import threading
-        
-        # Create download directory
+    def get_download_dir(self, mode):
+        """Create and return the download folder for a mode"""
         home_directory = Path.home()
         download_dir_name = f"Nursery_Downloads_{mode.capitalize()}"
         download_dir = home_directory / download_dir_name
         os.makedirs(download_dir, exist_ok=True)
-        
-        def download_single_image(url_filename_tuple):
-            """Download a single image - thread-safe function"""
-            url, filename = url_filename_tuple
+        return download_dir
+
+    def queue_extracted_posts(self, posts_data, processed_containers, exports, pipeline, download_dir, layout, catalog):
+        """
+        Send newly extracted posts to the data exports and hand their images to the download pipeline
+        Returns the number of posts that had not been seen before
+        """
+        queued = []
+        for i, post_data in enumerate(posts_data):
+            self.run_control.checkpoint()
             try:
-                full_path = download_dir / filename
-                
-                # Skip if file already exists
-                if full_path.exists():
-                    return True
-                
-                # Download with timeout
-                response = requests.get(url, stream=True, timeout=15)
-                response.raise_for_status()
-                
-                # Save image
-                with open(full_path, 'wb') as f:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        f.write(chunk)
+                if post_data and post_data.get('id') not in processed_containers:
+                    processed_containers.add(post_data.get('id', f'post_{i}'))
+                    
+                    catalog.add_post(post_data)
+                    # Buffered - each export writes in batches on its own schedule
+                    exports.write(post_data)
+                    
+                    # Queue images and videos straight away - workers download them in the background
+                    media_urls = post_data.get('image_urls', []) + post_data.get('video_urls', [])
+                    if media_urls:
+                        # Log carousel information if available
+                        if post_data.get('has_carousel'):
+                            self.log_message(f"Carousel detected: {post_data.get('carousel_count', 0)} images in {post_data.get('event_type', 'unknown')}")
+                        if post_data.get('video_urls'):
+                            self.log_message(f"Video detected: {len(post_data['video_urls'])} in {post_data.get('event_type', 'unknown')}")
+                        
+                        # Filenames use a content fingerprint, not the feed position, so they stay stable;
+                        # folders follow the chosen layout (e.g. year/month from the post date)
+                        fingerprint = post_fingerprint(post_data)
+                        for j, url in enumerate(media_urls):
+                            pipeline.submit(url, image_path(download_dir, post_data, j, url, layout), fingerprint, post_data)
+                    
+                    queued.append(post_data)
                 
-                return True
             except Exception as e:
-                self.log_message(f"Failed to download {filename}: {str(e)[:50]}")
-                return False
+                self.log_message(f"Error processing extracted post {i+1}: {str(e)[:200]}")
+                continue
         
-        # Download in parallel batches of 10 images to avoid overwhelming the server
-        downloaded_count = 0
-        batch_size = 10
+        if self.progress_model:
+            self.progress_model.extracted(queued)
+        return len(queued)
+
+    def start_library_task(self, worker):
+        """Run a library tool in a background thread with the buttons disabled"""
+        if self.is_running:
+            return
+        self.is_running = True
+        self.set_buttons_state('disabled')
+        self.progress_model = None  # Library tools drive the bar themselves
+        self.library_progress = 0.0
+        self.progress.set(0)
+        self.progress_label.configure(text="")
+        self.status_text.delete("1.0", "end")
         
-        for i in range(0, len(image_batch), batch_size):
-            batch = image_batch[i:i + batch_size]
+        thread = threading.Thread(target=worker)
+        thread.daemon = True
+        thread.start()
+
+    def library_task_finished(self):
+        """Show a library tool's final progress and re-enable the buttons (Tk thread)"""
+        if self.library_progress is not None:
+            self.progress.set(self.library_progress)
+        self.library_progress = None
+        self.is_running = False
+        self.set_buttons_state('normal')
+
+    def run_verify(self):
+        """Revalidate every downloaded image against the server without opening Chrome"""
+        self.start_library_task(self.verify_worker)
+
+    def run_retry_failures(self):
+        """Retry only the images in the failure log, without opening Chrome or logging in"""
+        self.start_library_task(self.retry_failures_worker)
+
+    def run_search(self):
+        """Full-text search of the Full and Test catalogs, shown in a results window"""
+        text = self.search_var.get().strip()
+        if not text:
+            return
+        catalogs = [Path.home() / f"Nursery_Data_{mode}.db" for mode in ("Full", "Test")]
+        catalogs = [path for path in catalogs if path.exists()]
+        if not catalogs:
+            show_error_dialog(self.root, "Search", "Nothing to search yet - run a scrape first")
+            return
+        
+        start_time = time.time()
+        # Both catalogs, so posts only a Test run has seen are still found once a Full one exists
+        results = search_catalogs(catalogs, text)
+        elapsed_ms = (time.time() - start_time) * 1000
+        
+        window = ctk.CTkToplevel(self.root)
+        window.title(f"Search: {text}")
+        window.geometry("700x500")
+        window.transient(self.root)
+        
+        summary = ctk.CTkLabel(window, text=f"{len(results)} posts found in {elapsed_ms:.0f} ms", font=ctk.CTkFont(size=14, weight="bold"))
+        summary.pack(anchor="w", padx=10, pady=(10, 5))
+        
+        results_text = ctk.CTkTextbox(window, wrap="word")
+        results_text.pack(fill="both", expand=True, padx=10, pady=(0, 10))
+        for result in results:
+            results_text.insert("end", f"{result['date']} {result['time']} - {result['event_type']}\n")
+            results_text.insert("end", f"{result['snippet']}\n")
+            for path in result['images']:
+                results_text.insert("end", f"    {path}\n")
+            results_text.insert("end", "\n")
+        results_text.configure(state="disabled")
+
+    def run_find_duplicates(self):
+        """Find photos posted more than once, even when resized or re-compressed"""
+        self.start_library_task(self.find_duplicates_worker)
+
+    def verify_worker(self):
+        """Conditional GET for each manifest entry - unchanged images cost a 304"""
+        from download_engine import revalidate_library
+        
+        try:
+            image_store = ImageStore()
+            total = len(image_store.entries)
+            if not total:
+                self.log_message("No downloaded images to verify yet - run a scrape first")
+                return
             
-            with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
-                results = list(executor.map(download_single_image, batch))
-                batch_success = sum(results)
-                downloaded_count += batch_success
-                
-                # Progress update
-                self.log_message(f"Downloaded batch {i//batch_size + 1}: {batch_success}/{len(batch)} images successful")
+            self.log_message(f"Verifying {total} downloaded images...")
+            start_time = time.time()
+            
+            def report(done, total, counts):
+                self.library_progress = done / total
+                self.log_message(f"Checked {done}/{total}: {counts['unchanged']} unchanged, {counts['updated']} updated, {counts['failed']} failed")
+            
+            counts = revalidate_library(image_store, progress_callback=report)
+            elapsed = time.time() - start_time
+            self.log_message(f"✅ Library verified in {elapsed:.1f}s: {counts['unchanged']} unchanged, {counts['updated']} re-downloaded, {counts['failed']} failed")
+            
+        except Exception as e:
+            self.log_message(f"❌ Verify failed: {e}")
+        finally:
+            self.root.after(0, self.library_task_finished)
+
+    def confirm_from_worker(self, title, message, confirm_text="OK"):
+        """Show a confirm dialog on the Tk thread and wait for the answer (worker threads only)"""
+        answered = threading.Event()
+        answer = [False]
+        
+        def ask():
+            try:
+                answer[0] = show_confirm_dialog(self.root, title, message, confirm_text)
+            finally:
+                answered.set()
+        
+        self.root.after(0, ask)
+        answered.wait()
+        return answer[0]
+
+    def find_duplicates_worker(self):
+        """Hash new photos, group near-duplicates and write a report (optionally hard-linking them)"""
+        from near_duplicates import PerceptualHashIndex, link_duplicates, write_report
         
-        return downloaded_count
+        try:
+            image_store = ImageStore()
+            if not image_store.entries:
+                self.log_message("No downloaded images to check yet - run a scrape first")
+                return
+            
+            start_time = time.time()
+            index = PerceptualHashIndex(image_store)
+            
+            def report(done, total):
+                self.library_progress = done / total
+            
+            hashed = index.update(progress_callback=report)
+            self.log_message(f"Hashed {hashed} new photos ({len(index.hashes)} cached) in {time.time() - start_time:.1f}s")
+            
+            groups = index.find_groups()
+            duplicates = sum(len(group) - 1 for group in groups)
+            if not groups:
+                self.log_message("✅ No near-duplicate photos found")
+                return
+            
+            report_path = Path.home() / "Nursery_Near_Duplicates.csv"
+            write_report(groups, report_path)
+            self.log_message(f"Found {duplicates} near-duplicates in {len(groups)} groups - see {report_path}")
+            if self.link_duplicates_var.get():
+                question = (f"Replace {duplicates} near-duplicates with links to the best copy in their group? "
+                            f"The other copies are deleted for good - check {report_path.name} first.")
+                if self.confirm_from_worker("Link duplicates", question, confirm_text="Link"):
+                    freed = link_duplicates(image_store, groups)
+                    self.log_message(f"✅ Linked duplicates to the best copy, freeing {freed / 1048576:.1f} MB")
+                else:
+                    self.log_message("Duplicates left as they are")
+            self.library_progress = 1.0
+            
+        except Exception as e:
+            self.log_message(f"❌ Duplicate check failed: {e}")
+        finally:
+            self.root.after(0, self.library_task_finished)
+
+    def retry_failures_worker(self):
+        """Push every logged failure back through the download pipeline"""
+        from download_engine import DownloadPipeline, FailureLog
+        
+        pipeline = None
+        post_processor = None
+        libraries = []  # (download folder, LibraryIndex, Catalog) for each mode with failures
+        run_status = 'failed'
+        counts = None
+        try:
+            image_store = ImageStore()
+            failures = FailureLog(image_store).entries()
+            if not failures:
+                self.log_message("No failed downloads to retry 🎉")
+                return
+            
+            self.log_message(f"Retrying {len(failures)} failed downloads...")
+            pipeline = DownloadPipeline(image_store, log=self.log_message)
+            post_processor = self.create_post_processor(image_store, pipeline)
+            
+            # Recovered images are indexed and cataloged like a scrape's, in the mode they belong to
+            for mode in ("full", "test"):
+                download_dir = Path.home() / f"Nursery_Downloads_{mode.capitalize()}"
+                if any(Path(failure['target']).is_relative_to(download_dir) for failure in failures):
+                    libraries.append((download_dir, LibraryIndex(download_dir),
+                                      Catalog(Path.home() / f"Nursery_Data_{mode.capitalize()}.db", "retry",
+                                              image_store, log=self.log_message)))
+            
+            def record(url, dest_path, result, fingerprint, post_data):
+                for download_dir, library_index, catalog in libraries:
+                    if Path(dest_path).is_relative_to(download_dir):
+                        library_index.on_downloaded(url, dest_path, result, fingerprint, post_data)
+                        catalog.on_downloaded(url, dest_path, result, fingerprint, post_data)
+            
+            post_processor.add_listener(record)
+            for failure in failures:
+                pipeline.submit(failure['url'], Path(failure['target']), failure.get('post_fingerprint'), failure.get('post'))
+            post_processor.drain()
+            post_processor.close()
+            counts = post_processor.merge_counts(pipeline.close())
+            
+            recovered = len(failures) - counts['failed']
+            self.library_progress = 1.0
+            self.log_message(f"✅ Recovered {recovered} of {len(failures)} images")
+            if counts['failed']:
+                self.log_message(f"⚠ {counts['failed']} still failing - their links may have expired; a new scrape will pick up fresh ones")
+            if recovered:
+                for download_dir, library_index, catalog in libraries:
+                    library_index.save()
+                    if BUILD_LIBRARY_VIEWS:
+                        LibraryViews(library_index).rebuild()
+                    if BUILD_HTML_GALLERY:
+                        catalog.flush()
+                        conn = open_catalog(catalog.path)
+                        try:
+                            HtmlGallery(conn, download_dir).build()
+                        finally:
+                            conn.close()
+                self.log_message("Index, views and gallery updated with the recovered images")
+            run_status = 'complete'
+            
+        except Exception as e:
+            self.log_message(f"❌ Retry failed: {e}")
+        finally:
+            if pipeline:
+                pipeline.close()
+            if post_processor:
+                post_processor.close()
+            for download_dir, library_index, catalog in libraries:
+                library_index.save()
+                catalog.close(status=run_status, counts=counts)
+            self.root.after(0, self.library_task_finished)
 
 def main():
+    # Needed for the post-processing process pool inside PyInstaller bundles
+    multiprocessing.freeze_support()
     root = ctk.CTk()
     app = ParentaScraper(root)
+    root.protocol("WM_DELETE_WINDOW", app.on_close)
     root.mainloop()
 
 if __name__ == "__main__":
@@ -0,0 +1,98 @@
+"""
+Startup timing for Parenta Scraper
+Milestones are always recorded, and the time until the window is ready is logged against
+STARTUP_BUDGET_SECONDS. With PARENTA_STARTUP_REPORT=1 (or --startup-report) every module import
+is timed as well, in the same format as python -X importtime, which can't be passed to a bundled
+executable
+"""
+import os
+import sys
+import threading
+import time
+
+STARTUP_BUDGET_SECONDS = 1.5  # From the app's first line to a usable window
+REPORT_ENV_VAR = "PARENTA_STARTUP_REPORT"
+REPORT_TOP_IMPORTS = 20  # Slowest imports listed in the status log; the file has all of them
+
+_started = time.perf_counter()
+_milestones = []  # (label, seconds since start)
+_imports = []  # (depth, name, self seconds, cumulative seconds) in completion order, like -X importtime
+_local = threading.local()  # Per-thread stack of child import time, so warm-up threads don't mix in
+
+
+def requested():
+    """True if a full startup report (with import timing) was asked for"""
+    return os.environ.get(REPORT_ENV_VAR) == "1" or "--startup-report" in sys.argv
+
+
+class _TimedLoader:
+    """Wraps a module's loader to time exec_module; everything else goes to the real loader"""
+
+    def __init__(self, loader):
+        self._loader = loader
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        stack = _local.__dict__.setdefault('stack', [])
+        stack.append(0.0)  # Time spent in this module's own imports
+        start = time.perf_counter()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            cumulative = time.perf_counter() - start
+            children = stack.pop()
+            if stack:
+                stack[-1] += cumulative
+            _imports.append((len(stack), module.__name__, cumulative - children, cumulative))
+
+
+class _TimingFinder:
+    """First entry on sys.meta_path: finds specs with the other finders and wraps their loaders"""
+
+    def find_spec(self, name, path=None, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, 'find_spec'):
+                continue
+            spec = finder.find_spec(name, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, 'exec_module'):
+                    spec.loader = _TimedLoader(spec.loader)
+                return spec
+        return None
+
+
+def install():
+    """Start timing imports if a report was requested; call before the imports to measure"""
+    if requested() and not any(isinstance(finder, _TimingFinder) for finder in sys.meta_path):
+        sys.meta_path.insert(0, _TimingFinder())
+
+
+def mark(label):
+    """Record a milestone; returns seconds since start"""
+    elapsed = time.perf_counter() - _started
+    _milestones.append((label, elapsed))
+    return elapsed
+
+
+def report_lines(top=REPORT_TOP_IMPORTS):
+    """Milestones, then the slowest imports if they were timed"""
+    lines = ["Startup milestones:"]
+    lines += [f"  {elapsed:6.3f}s  {label}" for label, elapsed in _milestones]
+    if _imports:
+        lines.append(f"Slowest imports (cumulative / self ms) of {len(_imports)}:")
+        for depth, name, own, cumulative in sorted(_imports, key=lambda item: item[3], reverse=True)[:top]:
+            lines.append(f"  {cumulative * 1000:7.1f} / {own * 1000:6.1f}  {name}")
+    return lines
+
+
+def write_importtime(path):
+    """Every timed import in -X importtime format (readable by tools such as tuna)"""
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("import time: self [us] | cumulative | imported package\n")
+        for depth, name, own, cumulative in _imports:
+            f.write(f"import time: {own * 1e6:9.0f} | {cumulative * 1e6:10.0f} | {'  ' * depth}{name}\n")
@@ -0,0 +1,184 @@
+"""
+Live photo thumbnails for Parenta Scraper
+A scrollable grid that fills in as photos finish downloading. Only the visible tiles exist as
+widgets, thumbnails are decoded on a small background pool, and a bounded LRU of CTkImages
+keeps memory flat whether the run has fifty photos or fifty thousand
+"""
+import collections
+import concurrent.futures
+import queue
+import threading
+
+import customtkinter as ctk
+
+THUMB_TILE_SIZE = 110  # Tile edge in pixels (4 across the 500px pane)
+THUMB_TILE_GAP = 4
+THUMB_DECODE_WORKERS = 2
+THUMB_CACHE_SIZE = 200  # CTkImages kept; older ones are decoded again if scrolled back to
+
+
+def decode_thumbnail(path, size=THUMB_TILE_SIZE):
+    """Small upright RGB image of a photo, or None if it can't be decoded"""
+    from PIL import Image, ImageOps
+
+    try:
+        with Image.open(path) as image:
+            image.draft('RGB', (size, size))  # JPEGs decode straight at a fraction of full size
+            image = ImageOps.exif_transpose(image).convert('RGB')
+            image.thumbnail((size, size))
+            return image
+    except Exception:
+        return None
+
+
+class ThumbnailGrid(ctk.CTkFrame):
+    """
+    Virtualised thumbnail grid, oldest photo first; it follows new photos while scrolled to the end
+    add() can be called from any thread; refresh() must run on the Tk thread (see pump_thumbnails)
+    """
+
+    def __init__(self, master, width, height, **kwargs):
+        from PIL import Image
+
+        super().__init__(master, width=width, height=height, **kwargs)
+        step = THUMB_TILE_SIZE + THUMB_TILE_GAP
+        self.columns = max(1, (width - 20) // step)  # Leave room for the scrollbar
+        self.visible_rows = max(1, height // step)
+        self.paths = []
+        self.first_row = 0
+        self.follow = True
+        self._lock = threading.Lock()  # Guards paths, which download threads append to
+        self._cache = collections.OrderedDict()  # path -> CTkImage, least recently shown first
+        self._failed = set()
+        self._pending = set()
+        self._wanted = frozenset()  # Paths on screen; decodes for anything else are skipped
+        self._decoded = queue.SimpleQueue()
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=THUMB_DECODE_WORKERS,
+                                                               thread_name_prefix="thumbnail")
+        blank = Image.new('RGB', (THUMB_TILE_SIZE, THUMB_TILE_SIZE), (128, 128, 128))
+        self._placeholder = ctk.CTkImage(light_image=blank, dark_image=blank, size=blank.size)
+
+        tiles_frame = ctk.CTkFrame(self, fg_color="transparent")
+        tiles_frame.pack(side="left", fill="both", expand=True)
+        self.scrollbar = ctk.CTkScrollbar(self, command=self._on_scrollbar)
+        self.scrollbar.pack(side="right", fill="y")
+
+        self.tiles = []
+        self._tile_state = []  # What each tile currently shows: None (hidden) or (path, image)
+        for slot in range(self.columns * self.visible_rows):
+            tile = ctk.CTkLabel(tiles_frame, text="", image=self._placeholder,
+                                width=THUMB_TILE_SIZE, height=THUMB_TILE_SIZE)
+            tile.grid(row=slot // self.columns, column=slot % self.columns,
+                      padx=THUMB_TILE_GAP // 2, pady=THUMB_TILE_GAP // 2)
+            tile.grid_remove()
+            self.tiles.append(tile)
+            self._tile_state.append(None)
+        for widget in (tiles_frame, *self.tiles):
+            widget.bind("<MouseWheel>", self._on_wheel)
+            widget.bind("<Button-4>", lambda event: self.scroll_rows(-1))
+            widget.bind("<Button-5>", lambda event: self.scroll_rows(1))
+
+    def add(self, path):
+        """A photo is ready on disk (any thread)"""
+        with self._lock:
+            self.paths.append(str(path))
+
+    def clear(self):
+        """Start again for a new run"""
+        with self._lock:
+            self.paths = []
+        self.first_row = 0
+        self.follow = True
+        self._failed.clear()
+
+    def _max_first_row(self, count):
+        total_rows = -(-count // self.columns)
+        return max(0, total_rows - self.visible_rows), total_rows
+
+    def scroll_rows(self, rows):
+        with self._lock:
+            count = len(self.paths)
+        max_first, _ = self._max_first_row(count)
+        self.first_row = min(max_first, max(0, self.first_row + rows))
+        self.follow = self.first_row >= max_first
+        self.refresh()
+
+    def _on_wheel(self, event):
+        self.scroll_rows(-1 if event.delta > 0 else 1)
+
+    def _on_scrollbar(self, action, value, units=None):
+        if action == 'scroll':
+            self.scroll_rows(int(value))
+            return
+        with self._lock:
+            count = len(self.paths)
+        _, total_rows = self._max_first_row(count)
+        self.scroll_rows(round(float(value) * total_rows) - self.first_row)
+
+    def refresh(self):
+        """Show the visible window of photos and queue decodes for tiles not cached yet (Tk thread)"""
+        self._collect_decoded()
+        with self._lock:
+            count = len(self.paths)
+            max_first, total_rows = self._max_first_row(count)
+            if self.follow:
+                self.first_row = max_first
+            self.first_row = min(self.first_row, max_first)
+            start = self.first_row * self.columns
+            visible = self.paths[start:start + len(self.tiles)]
+        self._wanted = frozenset(visible)
+
+        for slot, tile in enumerate(self.tiles):
+            if slot >= len(visible):
+                if self._tile_state[slot] is not None:
+                    tile.grid_remove()
+                    self._tile_state[slot] = None
+                continue
+            path = visible[slot]
+            image = self._cache.get(path)
+            if image:
+                self._cache.move_to_end(path)  # Visible tiles are never the ones evicted
+            else:
+                image = self._placeholder
+                if path not in self._failed and path not in self._pending:
+                    self._pending.add(path)
+                    self._executor.submit(self._decode, path)
+            state = self._tile_state[slot]
+            if state != (path, image):
+                if state is None:
+                    tile.grid()
+                tile.configure(image=image)
+                self._tile_state[slot] = (path, image)
+
+        if total_rows:
+            self.scrollbar.set(self.first_row / total_rows,
+                               min(1.0, (self.first_row + self.visible_rows) / total_rows))
+        else:
+            self.scrollbar.set(0, 1)
+
+    def _decode(self, path):
+        """Decode pool task; skips photos scrolled out of view while they waited"""
+        if path not in self._wanted:
+            self._decoded.put((path, None, True))
+            return
+        self._decoded.put((path, decode_thumbnail(path), False))
+
+    def _collect_decoded(self):
+        """Turn finished decodes into cached CTkImages (Tk thread, as Tk images must be)"""
+        while True:
+            try:
+                path, image, skipped = self._decoded.get_nowait()
+            except queue.Empty:
+                return
+            self._pending.discard(path)
+            if skipped:
+                continue
+            if image is None:
+                self._failed.add(path)
+                continue
+            self._cache[path] = ctk.CTkImage(light_image=image, dark_image=image, size=image.size)
+            if len(self._cache) > THUMB_CACHE_SIZE:
+                self._cache.popitem(last=False)
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)